@@ -1,18 +1,28 @@
 # app.py
 from flask import (
     Flask, request, jsonify, render_template, redirect, url_for, session,
-    send_file, flash
+    flash, Response, stream_with_context, g
 )
-from collections import deque
-import time, os, csv, io, joblib
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+import time, os, csv, io, json, math, queue, joblib, threading, zlib, gzip, sqlite3, cProfile, pstats, gc, weakref
 import pandas as pd
 import numpy as np
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+import click
 import smtplib
 from email.mime.text import MIMEText
 from twilio.rest import Client
+from background import BackgroundThread
+from compact_forest import CompactForest
+from live_state import make_live_state
+from metrics import Metrics
 
 # -----------------------
 # Config
@@ -26,6 +36,13 @@ TWILIO_SID = "your sid"
 TWILIO_TOKEN = "your token"
 TWILIO_FROM = "twilio phone number"
 TWILIO_TO = "your phone number"
+ALERT_TRANSPORT = os.environ.get("ALERT_TRANSPORT", "live")  # "stub" records alerts instead of sending
+
+try:
+    LOCAL_TZ = ZoneInfo("Asia/Kolkata")
+except Exception:
+    # no tz database (e.g. Windows without tzdata); IST has no DST so a fixed offset is exact
+    LOCAL_TZ = timezone(timedelta(hours=5, minutes=30))
 
 APP_SECRET = "replace_with_strong_secret"
 ADMIN_PASSWORD = "ccp2"
@@ -35,128 +52,1068 @@ DB_DIR = os.path.join(BASE_DIR, "instance")
 os.makedirs("instance", exist_ok=True)
 
 app.secret_key = APP_SECRET
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(DB_DIR, 'crops.db')}"
+# DATABASE_URL (e.g. Postgres on Heroku) overrides the bundled SQLite file
+DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'crops.db')}")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = "postgresql://" + DATABASE_URL[len("postgres://"):]
+app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# enough pooled connections for every gthread thread of a worker (see gunicorn.conf.py)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", "8")),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "24")),
+    "pool_pre_ping": not DATABASE_URL.startswith("sqlite"),
+}
+
+# WAL lets readers run alongside the writer; NORMAL sync is durable across app crashes
+# (only an OS crash can lose the last transactions), which is fine for sensor readings.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,        # KiB, i.e. 64 MB page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 30000,       # ms to wait for the write lock instead of failing
+}
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 db = SQLAlchemy(app)
 
+# -----------------------
+# Metrics (Prometheus text at /metrics)
+# -----------------------
+# per-worker snapshots are merged here; gunicorn.conf.py clears the directory when the server starts
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(DB_DIR, "metrics"))
+metrics = Metrics(namespace="crops", snapshot_dir=METRICS_DIR)
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route, method and status.")
+metrics.describe("span_duration_seconds", "histogram",
+                 "Time spent in hot-path sections (db_commit, model_load, predict, alert_dispatch, json_serialize).")
+metrics.describe("readings_accepted_total", "counter", "Sensor readings stored.")
+metrics.describe("alerts_raised_total", "counter", "Alerts opened, by condition.")
+metrics.describe("notifications_sent_total", "counter", "Alert notifications delivered, by channel.")
+metrics.describe("notifications_failed_total", "counter", "Failed alert notification attempts, by channel.")
+metrics.describe("model_reloads_total", "counter", "Model versions hot-loaded, by status (loaded/rejected).")
+metrics.describe("sse_rejected_total", "counter", "/events connections refused because the worker was at SSE_MAX_SUBSCRIBERS.")
+
 # -----------------------
 # DB models
 # -----------------------
 class SensorReading(db.Model):
+    # (timestamp, id) matches the keyset order of the export; (device, timestamp) serves /history?device=
+    __table_args__ = (db.Index("ix_sensor_reading_timestamp", "timestamp", "id"),
+                      db.Index("ix_sensor_reading_device_timestamp", "device", "timestamp"))
     id = db.Column(db.Integer, primary_key=True)
     temperature = db.Column(db.Float, nullable=False)
     humidity = db.Column(db.Float, nullable=False)
     soil = db.Column(db.Integer, nullable=False)
     soil_status = db.Column(db.String(16), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    device = db.Column(db.String(64), default="default")
 
 class Alert(db.Model):
+    __table_args__ = (db.Index("ix_alert_created_at", "created_at"),
+                      db.Index("ix_alert_notify_status", "notify_status"))
     id = db.Column(db.Integer, primary_key=True)
     reading_id = db.Column(db.Integer, db.ForeignKey('sensor_reading.id'), nullable=True)
     message = db.Column(db.String(256))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolved = db.Column(db.Boolean, default=False)
+    # notification delivery state, driven by AlertDispatcher
+    notify_status = db.Column(db.String(16), default="pending")  # pending/sending/retry/sent/failed
+    notify_attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    channels_sent = db.Column(db.String(64), default="")
+    last_error = db.Column(db.String(256), nullable=True)
+    # coalescing state, driven by AlertEngine
+    sensor = db.Column(db.String(64), default="default")
+    condition = db.Column(db.String(32), nullable=True)
+    trigger_count = db.Column(db.Integer, default=1)
+    last_seen_at = db.Column(db.DateTime, nullable=True)
 
-with app.app_context():
+# The admin console lists open alerts newest first; resolved rows (the vast majority after
+# a few months) are left out of this index, so it stays small. Queries must filter with
+# Alert.resolved.is_(False), the same expression, for the planner to pick it.
+db.Index("ix_alert_open_created_at", Alert.created_at,
+         sqlite_where=Alert.resolved.is_(False), postgresql_where=Alert.resolved.is_(False))
+
+class SensorRollup(db.Model):
+    """Per-device, per-bucket aggregates of SensorReading, kept current at ingest (see update_rollups)."""
+    # replaces the fleet-wide sensor_rollup table (see migrate_device_rollups)
+    __tablename__ = "sensor_device_rollup"
+    __table_args__ = (db.UniqueConstraint("resolution", "device", "bucket_start", name="uq_device_rollup_bucket"),
+                      db.Index("ix_device_rollup_bucket", "resolution", "bucket_start"))
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.String(4), nullable=False)  # one of ROLLUP_RESOLUTIONS
+    device = db.Column(db.String(64), nullable=False, default="default")
+    bucket_start = db.Column(db.Integer, nullable=False)  # epoch seconds, IST-aligned
+    count = db.Column(db.Integer, nullable=False, default=0)
+    temperature_sum = db.Column(db.Float, nullable=False, default=0.0)
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    humidity_sum = db.Column(db.Float, nullable=False, default=0.0)
+    humidity_min = db.Column(db.Float)
+    humidity_max = db.Column(db.Float)
+    soil_sum = db.Column(db.Float, nullable=False, default=0.0)
+    soil_min = db.Column(db.Float)
+    soil_max = db.Column(db.Float)
+
+# Columns added after the first release; create_all() does not alter existing tables.
+# Alerts that existed before the dispatcher were already notified inline, hence DEFAULT 'sent'.
+SCHEMA_UPGRADES = [
+    ("alert", "notify_status", "VARCHAR(16) DEFAULT 'sent'"),
+    ("alert", "notify_attempts", "INTEGER DEFAULT 0"),
+    ("alert", "next_attempt_at", "DATETIME"),
+    ("alert", "channels_sent", "VARCHAR(64) DEFAULT ''"),
+    ("alert", "last_error", "VARCHAR(256)"),
+    ("alert", "sensor", "VARCHAR(64) DEFAULT 'default'"),
+    ("alert", "condition", "VARCHAR(32)"),
+    ("alert", "trigger_count", "INTEGER DEFAULT 1"),
+    ("alert", "last_seen_at", "DATETIME"),
+    ("sensor_reading", "device", "VARCHAR(64) DEFAULT 'default'"),
+]
+
+SCHEMA_LOCK_PATH = os.path.join(DB_DIR, "schema.lock")
+
+@contextmanager
+def schema_lock():
+    """
+    Serialize the import-time schema steps between processes that start together
+    (gunicorn workers, asgi_ingest, CLI commands): each takes its turn, and the later
+    ones re-check and find nothing left to do. A POSIX file lock, so it covers one
+    host; without fcntl (Windows dev servers run one process) no lock is taken.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(SCHEMA_LOCK_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def upgrade_schema():
+    # a fresh inspector: columns are read under schema_lock, after any other process's changes
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, column, ddl in SCHEMA_UPGRADES:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        # create_all() skips existing tables, including their indexes; IF NOT EXISTS keeps
+        # workers that start at the same time from tripping over each other
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+with app.app_context(), schema_lock():
     db.create_all()
+    upgrade_schema()
 
 # -----------------------
 # Alerts
 # -----------------------
 def send_email_alert(message):
-    try:
-        msg = MIMEText(message)
-        msg['Subject'] = "🚨 Smart Farming Alert"
-        msg['From'] = EMAIL_SENDER
-        msg['To'] = EMAIL_RECEIVER
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.send_message(msg)
-        print("✅ Email alert sent")
-    except Exception as e:
-        print("❌ Email failed:", e)
+    msg = MIMEText(message)
+    msg['Subject'] = "🚨 Smart Farming Alert"
+    msg['From'] = EMAIL_SENDER
+    msg['To'] = EMAIL_RECEIVER
+    with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=20) as server:
+        server.login(EMAIL_SENDER, EMAIL_PASSWORD)
+        server.send_message(msg)
 
 def send_sms_alert(message):
-    try:
-        client = Client(TWILIO_SID, TWILIO_TOKEN)
-        client.messages.create(
-            body="🚨 Smart Farming Alert: " + message,
-            from_=TWILIO_FROM,
-            to=TWILIO_TO
+    client = Client(TWILIO_SID, TWILIO_TOKEN)
+    client.messages.create(
+        body="🚨 Smart Farming Alert: " + message,
+        from_=TWILIO_FROM,
+        to=TWILIO_TO
+    )
+
+class StubTransport:
+    """Records messages instead of sending them (ALERT_TRANSPORT=stub, local dev and tests)."""
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+
+    def __call__(self, message):
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("stub transport failure")
+        self.sent.append(message)
+
+def build_transports():
+    if ALERT_TRANSPORT == "stub":
+        return {"email": StubTransport(), "sms": StubTransport()}
+    return {"email": send_email_alert, "sms": send_sms_alert}
+
+class AlertDispatcher:
+    """
+    Delivers alert notifications from a background thread.
+
+    The Alert table is the queue: rows start as 'pending', are claimed with a
+    conditional UPDATE (safe with several gunicorn workers), and failed channels
+    are retried with exponential backoff until max_attempts is reached.
+    """
+    def __init__(self, app, transports, max_attempts=5, base_delay=30, max_delay=3600,
+                 poll_interval=15, lease=300, batch_size=50):
+        self.app = app
+        self.transports = transports
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._thread = BackgroundThread(self._run, "alert-dispatcher")
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            # clear before draining: a wake() that arrives while run_once() is working
+            # leaves the event set, so the next wait returns at once instead of sleeping
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                print("❌ Alert dispatch loop failed:", e)
+            self._wakeup.wait(self.poll_interval)
+
+    def _claim(self, alert_id, now):
+        # only one worker wins the conditional update; the lease lets a crashed claim be retried
+        claimed = db.session.execute(
+            db.update(Alert)
+            .where(Alert.id == alert_id,
+                   Alert.notify_status.in_(("pending", "retry", "sending")),
+                   db.or_(Alert.next_attempt_at.is_(None), Alert.next_attempt_at <= now))
+            .values(notify_status="sending", next_attempt_at=now + timedelta(seconds=self.lease))
         )
-        print("✅ SMS alert sent")
-    except Exception as e:
-        print("❌ SMS failed:", e)
+        db.session.commit()
+        return claimed.rowcount == 1
 
-def create_alert_if_needed(reading: SensorReading):
-    try:
-        soil_threshold = 25
-        if reading.soil < soil_threshold:
-            msg = f"Low soil moisture: {reading.soil}% at {reading.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
-            alert = Alert(reading_id=reading.id, message=msg)
+    def run_once(self):
+        """Deliver every due alert once; returns the number of alerts processed."""
+        now = datetime.utcnow()
+        due = db.session.execute(
+            db.select(Alert.id)
+            .where(Alert.notify_status.in_(("pending", "retry", "sending")),
+                   db.or_(Alert.next_attempt_at.is_(None), Alert.next_attempt_at <= now))
+            .order_by(Alert.id)
+            .limit(self.batch_size)
+        ).scalars().all()
+        processed = 0
+        for alert_id in due:
+            if self._claim(alert_id, now):
+                with metrics.span("alert_dispatch"):
+                    self._deliver(db.session.get(Alert, alert_id))
+                processed += 1
+        return processed
+
+    def _deliver(self, alert):
+        done = set(filter(None, (alert.channels_sent or "").split(",")))
+        errors = []
+        for name, send in self.transports.items():
+            if name in done:
+                continue
+            try:
+                send(alert.message)
+                done.add(name)
+                metrics.inc("notifications_sent_total", channel=name)
+                print(f"✅ {name} alert sent")
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                metrics.inc("notifications_failed_total", channel=name)
+                print(f"❌ {name} failed:", e)
+        alert.channels_sent = ",".join(sorted(done))
+        alert.notify_attempts = (alert.notify_attempts or 0) + 1
+        if not errors:
+            alert.notify_status = "sent"
+            alert.next_attempt_at = None
+            alert.last_error = None
+        elif alert.notify_attempts >= self.max_attempts:
+            alert.notify_status = "failed"
+            alert.next_attempt_at = None
+            alert.last_error = "; ".join(errors)[:256]
+        else:
+            delay = min(self.base_delay * 2 ** (alert.notify_attempts - 1), self.max_delay)
+            alert.notify_status = "retry"
+            alert.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            alert.last_error = "; ".join(errors)[:256]
+        db.session.commit()
+
+alert_dispatcher = AlertDispatcher(app, build_transports())
+
+@app.before_request
+def ensure_alert_dispatcher():
+    # picks up alerts left pending by a previous process
+    alert_dispatcher.start()
+
+@app.before_request
+def ensure_model_watcher():
+    model_registry.start()
+
+@app.before_request
+def start_request_metrics():
+    metrics.start()
+    g.request_started = time.perf_counter()
+    # opt-in profiling for admins: any route with ?profile=1 returns a cProfile summary instead
+    if request.args.get("profile") == "1" and session.get("admin_authenticated"):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_request_metrics(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        out = io.StringIO()
+        out.write(f"{request.method} {request.full_path} -> {response.status}\n\n")
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        response = Response(out.getvalue(), mimetype="text/plain")
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
+    return response
+
+# trigger below trigger_below, clear again only at clear_at or above (hysteresis)
+ALERT_RULES = [
+    {"condition": "low_soil", "metric": "soil", "trigger_below": 25, "clear_at": 30,
+     "label": "Low soil moisture", "unit": "%"},
+]
+
+class AlertEngine:
+    """
+    Coalesces repeated threshold breaches into one open alert per sensor/condition.
+
+    A new Alert row (and notification) is only created when a condition starts;
+    while it persists, hits are counted in memory and written back as
+    trigger_count/last_seen_at at most every flush_interval seconds. A condition
+    that re-triggers within cooldown seconds of its last hit reopens the previous
+    alert instead of notifying again.
+    """
+    def __init__(self, rules, cooldown=1800, flush_interval=60):
+        self.rules = rules
+        self.cooldown = timedelta(seconds=cooldown)
+        self.flush_interval = timedelta(seconds=flush_interval)
+        self.state = {}  # (sensor, condition) -> {"alert_id", "active", "last_seen", "delta", "last_flush"}
+        self._lock = threading.Lock()
+
+    def evaluate(self, readings, sensor="default"):
+        """Run the rules over flushed (id-bearing) readings; returns newly opened alerts. The caller commits."""
+        opened = []
+        with self._lock:
+            for reading in sorted(readings, key=lambda r: r.timestamp):
+                for rule in self.rules:
+                    alert = self._apply(rule, reading, sensor)
+                    if alert is not None:
+                        opened.append(alert)
+            self._flush()
+        return opened
+
+    def _apply(self, rule, reading, sensor):
+        key = (sensor, rule["condition"])
+        value = getattr(reading, rule["metric"])
+        ts = reading.timestamp
+        st = self.state.get(key)
+        if value < rule["trigger_below"]:
+            if st and st["active"]:
+                st["delta"] += 1
+                st["last_seen"] = max(st["last_seen"], ts)
+                return None
+            alert_id = st["alert_id"] if st and ts - st["last_seen"] <= self.cooldown else self._find_recent(key, ts)
+            if alert_id is not None:
+                self.state[key] = {"alert_id": alert_id, "active": True, "last_seen": ts, "delta": 1,
+                                   "last_flush": datetime.utcnow()}
+                return None
+            msg = f"{rule['label']}: {value}{rule['unit']} at {ts.strftime('%Y-%m-%d %H:%M:%S')}"
+            alert = Alert(reading_id=reading.id, message=msg, sensor=sensor, condition=rule["condition"],
+                          trigger_count=1, last_seen_at=ts)
             db.session.add(alert)
-            db.session.commit()
-            send_email_alert(msg)
-            send_sms_alert(msg)
-            return True
-    except Exception as e:
-        print("Alert check failed:", e)
-    return False
+            db.session.flush()
+            self.state[key] = {"alert_id": alert.id, "active": True, "last_seen": ts, "delta": 0,
+                               "last_flush": datetime.utcnow()}
+            return alert
+        if st and st["active"] and value >= rule["clear_at"]:
+            st["active"] = False
+        return None
+
+    def _find_recent(self, key, ts):
+        # another worker (or a previous process) may already hold the open alert
+        sensor, condition = key
+        return db.session.execute(
+            db.select(Alert.id)
+            .where(Alert.sensor == sensor, Alert.condition == condition, Alert.resolved.is_(False),
+                   Alert.last_seen_at >= ts - self.cooldown)
+            .order_by(Alert.id.desc())
+            .limit(1)
+        ).scalar()
+
+    def _flush(self):
+        now = datetime.utcnow()
+        for key, st in list(self.state.items()):
+            if st["delta"] == 0:
+                continue
+            if st["active"] and now - st["last_flush"] < self.flush_interval:
+                continue
+            # increment rather than overwrite so several workers can coalesce into one row
+            updated = db.session.execute(
+                db.update(Alert)
+                .where(Alert.id == st["alert_id"], Alert.resolved.is_(False))
+                .values(trigger_count=Alert.trigger_count + st["delta"],
+                        last_seen_at=db.case((Alert.last_seen_at > st["last_seen"], Alert.last_seen_at),
+                                             else_=st["last_seen"]))
+            )
+            if updated.rowcount == 0:
+                # resolved (or deleted) meanwhile: the next breach opens a fresh alert
+                del self.state[key]
+                continue
+            st["delta"] = 0
+            st["last_flush"] = now
+
+    def forget(self, *alert_ids):
+        with self._lock:
+            for key, st in list(self.state.items()):
+                if st["alert_id"] in alert_ids:
+                    del self.state[key]
+
+alert_engine = AlertEngine(ALERT_RULES)
 
 # -----------------------
 # Models for Price Prediction (load existing)
 # -----------------------
-def get_crop_names():
-    if not os.path.exists('models'):
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+# joblib mmap_mode for model files ("r" shares ndarray pages between forked workers; "" disables)
+MODEL_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None
+# load every crop at import (gunicorn master with preload_app) instead of on first use
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "0") == "1"
+# "auto" serves models/{crop}_forest.npz when present, "sklearn" always uses the pickled forest
+PRICE_MODEL_FORMAT = os.environ.get("PRICE_MODEL_FORMAT", "auto")
+# seconds between checks of models/manifest.json for a newly published version (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", 5))
+
+def get_crop_names(directory=MODEL_DIR):
+    if not os.path.exists(directory):
         return []
-    model_files = [f for f in os.listdir('models') if f.endswith('_model.pkl') or f.endswith('_rainfall_model.pkl')]
-    crop_names = []
-    for f in model_files:
+    crop_names = set()
+    for f in os.listdir(directory):
         if f.endswith('_rainfall_model.pkl'):
-            crop_names.append(f.split('_rainfall_model.pkl')[0])
-        else:
-            crop_names.append(f.split('_model.pkl')[0])
-    return [name for name in crop_names if not name.endswith('_rainfall')]
-
-def load_models():
-    models = {}
-    thresholds = {}
-    future_predictions = {}
-    crop_names = get_crop_names()
-    for crop in crop_names:
-        rainfall_model_path = f'models/{crop}_rainfall_model.pkl'
-        threshold_path = f'models/{crop}_thresholds.pkl'
-        future_pred_path = f'models/{crop}_future_predictions.pkl'
-        if os.path.exists(rainfall_model_path):
+            crop_names.add(f[:-len('_rainfall_model.pkl')])
+        elif f.endswith('_model.pkl'):
+            crop_names.add(f[:-len('_model.pkl')])
+    return sorted(crop_names)
+
+class LazyArtifacts(Mapping):
+    """
+    crop -> model artifact, loaded on first access.
+
+    sources is a list of (file suffix, loader) tried in order, so e.g. the compact
+    forest wins over the pickled sklearn model when both exist. Only crops with a
+    file are keys. A file that fails to load is reported once and then behaves as
+    missing, like the old eager loader.
+    """
+    _FAILED = object()
+
+    def __init__(self, sources, crops, directory=MODEL_DIR):
+        self._paths = {}
+        self._loaders = {}
+        for crop in crops:
+            for suffix, loader in sources:
+                path = os.path.join(directory, f"{crop}_{suffix}")
+                if os.path.exists(path):
+                    self._paths[crop] = path
+                    self._loaders[crop] = loader
+                    break
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self.load_seconds = {}
+
+    def __getitem__(self, crop):
+        value = self._loaded.get(crop)
+        if value is None:
+            if crop not in self._paths:
+                raise KeyError(crop)
+            with self._lock:
+                value = self._loaded.get(crop)
+                if value is None:
+                    start = time.perf_counter()
+                    try:
+                        value = self._loaders[crop](self._paths[crop])
+                    except Exception as e:
+                        print(f"⚠️ Failed to load {self._paths[crop]}: {e}")
+                        value = self._FAILED
+                    self.load_seconds[crop] = time.perf_counter() - start
+                    metrics.observe("span_duration_seconds", self.load_seconds[crop], span="model_load")
+                    self._loaded[crop] = value
+        if value is self._FAILED:
+            raise KeyError(crop)
+        return value
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def preload(self):
+        for crop in list(self._paths):
             try:
-                models[crop] = joblib.load(rainfall_model_path)
+                self[crop]
+            except KeyError:
+                pass
+
+class ForecastAdjustment:
+    """
+    train.py's post-processing of raw model WPI: annual growth after base_year, MSP
+    alignment, and the flat impact of the excessive/deficient scenarios.
+    """
+    def __init__(self, base_year, annual_growth, adjustment_factor, impacts):
+        self.base_year = int(base_year)
+        self.annual_growth = float(annual_growth)
+        self.adjustment_factor = float(adjustment_factor)
+        self.impacts = impacts
+
+    def apply(self, wpi, year, scenario=None):
+        factor = (1 + self.annual_growth) ** max(0, year - self.base_year) * self.adjustment_factor
+        return wpi * factor * (1 + self.impacts.get(scenario, 0.0))
+
+class ForecastCube:
+    """Dense (year, month, rainfall) WPI cube from train.py, linearly interpolated along rainfall."""
+    def __init__(self, years, rainfall, wpi, adjustment=None):
+        self.years = years.astype(int)
+        self.rainfall = rainfall
+        self.wpi = wpi
+        # None for cubes written before train.py saved its post-processing with them
+        self.adjustment = adjustment
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            adjustment = None
+            if "base_year" in data.files:
+                adjustment = ForecastAdjustment(data["base_year"], data["annual_growth"], data["adjustment_factor"],
+                                                {"excessive": float(data["excessive_impact"]),
+                                                 "deficient": float(data["deficient_impact"])})
+            return cls(data["years"], data["rainfall"], data["wpi"], adjustment)
+
+    def lookup(self, rainfall, years):
+        """{year: 12 monthly values} for the requested years inside the cube; empty if rainfall is outside."""
+        if not self.rainfall[0] <= rainfall <= self.rainfall[-1]:
+            return {}
+        rows = np.searchsorted(self.years, years)
+        found = [(year, row) for year, row in zip(years, rows) if row < len(self.years) and self.years[row] == year]
+        if not found:
+            return {}
+        hi = min(int(np.searchsorted(self.rainfall, rainfall)), len(self.rainfall) - 1)
+        lo = max(hi - 1, 0)
+        span = self.rainfall[hi] - self.rainfall[lo]
+        w = (rainfall - self.rainfall[lo]) / span if span > 0 else 0.0
+        block = self.wpi[[row for _, row in found]]
+        block = block[:, :, lo] * (1 - w) + block[:, :, hi] * w
+        return {year: values for (year, _), values in zip(found, block)}
+
+def joblib_loader(mmap_mode=None):
+    return lambda path: joblib.load(path, mmap_mode=mmap_mode)
+
+def model_sources():
+    sources = [("rainfall_model.pkl", joblib_loader(MODEL_MMAP_MODE))]
+    if PRICE_MODEL_FORMAT == "auto":
+        # flattened forest exported by train.py; same predictions, much cheaper to load and run
+        sources.insert(0, ("forest.npz", CompactForest.load))
+    return sources
+
+class ModelSet:
+    """One model version: every artifact of every crop, read from a single directory."""
+    def __init__(self, directory=MODEL_DIR, version=None):
+        self.directory = directory
+        self.version = version or "unversioned"
+        self.crop_names = get_crop_names(directory)
+        self.models = LazyArtifacts(model_sources(), self.crop_names, directory)
+        self.thresholds = LazyArtifacts([("thresholds.pkl", joblib_loader())], self.models, directory)
+        self.future_predictions = LazyArtifacts([("future_predictions.pkl", joblib_loader())], self.models, directory)
+        self.forecast_cubes = LazyArtifacts([("forecast_cube.npz", ForecastCube.load)], self.models, directory)
+        self.forecast_indexes = {}
+        self.loaded_at = datetime.utcnow()
+
+    def artifacts(self):
+        return (self.models, self.thresholds, self.future_predictions, self.forecast_cubes)
+
+    def preload(self):
+        for artifacts in self.artifacts():
+            artifacts.preload()
+
+    def status(self):
+        return {
+            "version": self.version,
+            "directory": os.path.relpath(self.directory, BASE_DIR),
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds") + "Z",
+            "crops": {crop: {"loaded": crop in self.models._loaded,
+                             "load_seconds": round(sum(a.load_seconds.get(crop, 0.0) for a in self.artifacts()), 4)}
+                      for crop in self.crop_names},
+        }
+
+def validate_model_set(model_set):
+    """Problems that make a version unfit to serve: missing artifacts, or predictions that are not finite."""
+    if not model_set.crop_names:
+        return ["no models"]
+    problems = []
+    for crop in model_set.crop_names:
+        crop_thresholds = model_set.thresholds.get(crop)
+        if crop not in model_set.models or crop_thresholds is None:
+            problems.append(f"{crop}: model or thresholds failed to load")
+            continue
+        features = build_price_features(crop, crop_thresholds['mean_rainfall'], int(crop_thresholds['max_year']),
+                                        range(1, 13), model_set)
+        if not np.isfinite(model_set.models[crop].predict(features)).all():
+            problems.append(f"{crop}: non-finite predictions")
+    return problems
+
+class ModelRegistry:
+    """
+    The ModelSet being served, replaced without a restart when train.py publishes a version.
+
+    train.py copies a version into models/ and writes models/manifest.json last. Each
+    process polls the manifest's mtime; on a change it opens models/versions/<version>
+    (immutable, unlike models/ which is overwritten file by file), preloads and validates
+    it off the request path and swaps it in with one assignment. A request reads
+    `current` once and uses that set throughout, so it never mixes two versions; the
+    old set is garbage once the last request holding it finishes.
+    """
+    def __init__(self, model_dir, interval=MODEL_RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.interval = interval
+        self.history = deque(maxlen=20)  # recent reload attempts, newest last
+        self._retired = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = BackgroundThread(self._run, "model-reload")
+        self._manifest_mtime = self._mtime()
+        self.current = self.open(self.read_manifest())
+        if MODEL_PRELOAD:
+            self.current.preload()
+
+    def _mtime(self):
+        try:
+            return os.stat(os.path.join(self.model_dir, "manifest.json")).st_mtime_ns
+        except OSError:
+            return None
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.model_dir, "manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def open(self, manifest):
+        version = manifest.get("version")
+        version_dir = os.path.join(self.model_dir, "versions", str(version))
+        if version and os.path.isdir(version_dir):
+            return ModelSet(version_dir, version)
+        # no manifest (models copied in by hand): serve models/ as it is
+        return ModelSet(self.model_dir, version)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print("⚠️ Model reload check failed:", e)
+
+    def check(self):
+        """Reload if manifest.json changed since the last check; True if a new version was swapped in."""
+        mtime = self._mtime()
+        if mtime is None or mtime == self._manifest_mtime:
+            return False
+        self._manifest_mtime = mtime
+        return self.reload()
+
+    def reload(self):
+        with self._lock:
+            manifest = self.read_manifest()
+            version = manifest.get("version")
+            if not version or version == self.current.version:
+                return False
+            start = time.perf_counter()
+            try:
+                candidate = self.open(manifest)
+                candidate.preload()
+                problems = validate_model_set(candidate)
             except Exception as e:
-                print(f"⚠️ Failed to load {rainfall_model_path}: {e}")
-            thresholds[crop] = joblib.load(threshold_path) if os.path.exists(threshold_path) else None
-            future_predictions[crop] = joblib.load(future_pred_path) if os.path.exists(future_pred_path) else None
-    return models, thresholds, future_predictions, crop_names
+                problems = [f"{type(e).__name__}: {e}"]
+            entry = {"version": version, "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                     "seconds": round(time.perf_counter() - start, 3),
+                     "status": "rejected" if problems else "loaded", "problems": problems}
+            self.history.append(entry)
+            metrics.inc("model_reloads_total", status=entry["status"])
+            if problems:
+                print(f"⚠️ Model version {version} rejected: {'; '.join(problems)}")
+                return False
+            old, self.current = self.current, candidate
+            self._retired.add(old)
+            price_cache.clear()
+            del old
+            gc.collect()
+            print(f"🔄 Model version {version} loaded in {entry['seconds']}s")
+            return True
 
-models, thresholds, future_predictions, crop_names = load_models()
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "current": self.current.status(),
+            "watching": os.path.join(os.path.relpath(self.model_dir, BASE_DIR), "manifest.json"),
+            "reload_interval": self.interval,
+            # old sets still referenced by in-flight requests; should drop to [] shortly after a swap
+            "retired_in_use": sorted(m.version for m in self._retired),
+            "history": list(self.history),
+        }
 
 # -----------------------
-# In-memory cache (includes heat_index)
+# Price inference (feature vector mirrors train.py:train_crop_model)
 # -----------------------
-latest_data = {"temperature": 0.0, "humidity": 0.0, "soil": 0, "soil_status": "Unknown", "heat_index": None, "time": None}
-history_cache = deque(maxlen=200)  # recent entries (with heat_index & local time)
+RAINFALL_BUCKET_MM = 1.0   # rainfall is snapped to this grid before predicting/caching
+PRICE_CACHE_SIZE = 4096    # cached (crop, rainfall bucket, year, month) predictions
+
+class LRUCache:
+    """Small thread-safe LRU map."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+price_cache = LRUCache(PRICE_CACHE_SIZE)
+
+def rainfall_bucket(rainfall):
+    return round(round(rainfall / RAINFALL_BUCKET_MM) * RAINFALL_BUCKET_MM, 3)
+
+def classify_rainfall(crop_thresholds, rainfall):
+    """Return (label, Rainfall_Category value) using the same 0.75*std bands as training."""
+    mean_rainfall = crop_thresholds['mean_rainfall'] if crop_thresholds else 0
+    std_rainfall = crop_thresholds['std_rainfall'] if crop_thresholds else 0
+    deficient_threshold = mean_rainfall - 0.75 * std_rainfall
+    excessive_threshold = mean_rainfall + 0.75 * std_rainfall
+    if rainfall > excessive_threshold:
+        return "Excessive", 1
+    if rainfall < deficient_threshold:
+        return "Deficient", -1
+    return "Normal", 0
+
+def build_price_features(crop, rainfall, year, months, model_set, category=None, deviation=None):
+    """
+    One feature row per month: Month, Year, rainfall, Rainfall_Category, Rainfall_Deviation.
+    The category and deviation follow from the rainfall unless given.
+    """
+    model = model_set.models[crop]
+    crop_thresholds = model_set.thresholds.get(crop)
+    mean_rainfall = crop_thresholds['mean_rainfall'] if crop_thresholds else 0
+    if category is None:
+        _, category = classify_rainfall(crop_thresholds, rainfall)
+    if deviation is None:
+        deviation = rainfall - mean_rainfall
+    months = np.asarray(months, dtype=float)
+    n = len(months)
+    # the rainfall column was 'Rainfall_x' or 'Rainfall' depending on the training data
+    feature_names = list(getattr(model, "feature_names_in_",
+                                 ['Month', 'Year', 'Rainfall', 'Rainfall_Category', 'Rainfall_Deviation']))
+    X = np.column_stack([
+        months,
+        np.full(n, float(year)),
+        np.full(n, float(rainfall)),
+        np.full(n, float(category)),
+        np.full(n, float(deviation)),
+    ])
+    return pd.DataFrame(X, columns=feature_names)
+
+def predict_months(crop, rainfall, year, months, model_set=None):
+    """WPI predictions for several months of one year; cache misses are predicted in a single call."""
+    model_set = model_set or model_registry.current
+    bucket = rainfall_bucket(rainfall)
+    months = [int(m) for m in months]
+    out = {}
+    missing = []
+    for month in months:
+        cached = price_cache.get((model_set.version, crop, bucket, year, month))
+        if cached is None:
+            missing.append(month)
+        else:
+            out[month] = cached
+    if missing:
+        model = model_set.models[crop]
+        features = build_price_features(crop, bucket, year, missing, model_set)
+        with metrics.span("predict"):
+            preds = model.predict(features)
+        for month, value in zip(missing, preds):
+            value = float(value)
+            price_cache.put((model_set.version, crop, bucket, year, month), value)
+            out[month] = value
+    return np.array([out[m] for m in months])
+
+def predict_year(crop, rainfall, year, model_set=None):
+    """Monthly WPI (Jan..Dec) for one year from one predict call."""
+    return predict_months(crop, rainfall, year, range(1, 13), model_set)
 
 # -----------------------
-# Crop recommendation helper
+# Precomputed forecast tables (train.py:generate_future_predictions)
 # -----------------------
+FORECAST_SCENARIOS = {"normal": "Predicted_WPI", "excessive": "Excessive_WPI", "deficient": "Deficient_WPI"}
+MAX_FORECAST_YEARS = 50
+
+class ForecastIndex:
+    """A crop's future_predictions table as dense (year, month) NumPy arrays per scenario."""
+    def __init__(self, df):
+        self.years = np.sort(df['Year'].unique()).astype(int)
+        # the table is predicted at one rainfall (the crop's optimum) with Normal category and no deviation
+        rainfall_column = 'Rainfall_x' if 'Rainfall_x' in df.columns else 'Rainfall'
+        self.rainfall = float(df[rainfall_column].iloc[0]) if rainfall_column in df.columns else None
+        self.tables = {}
+        year_idx = np.searchsorted(self.years, df['Year'].to_numpy())
+        month_idx = df['Month'].to_numpy().astype(int) - 1
+        for scenario, column in FORECAST_SCENARIOS.items():
+            if column not in df.columns:
+                continue
+            table = np.full((len(self.years), 12), np.nan)
+            table[year_idx, month_idx] = df[column].to_numpy()
+            self.tables[scenario] = table
+
+    def lookup(self, scenario, year):
+        """The 12 monthly values for a year, or None if the year/scenario is not fully in the table."""
+        table = self.tables.get(scenario)
+        if table is None:
+            return None
+        i = np.searchsorted(self.years, year)
+        if i >= len(self.years) or self.years[i] != year:
+            return None
+        row = table[i]
+        return None if np.isnan(row).any() else row
+
+def get_forecast_index(crop, model_set):
+    if crop not in model_set.forecast_indexes:
+        df = model_set.future_predictions.get(crop)
+        model_set.forecast_indexes[crop] = ForecastIndex(df) if df is not None else None
+    return model_set.forecast_indexes[crop]
+
+def predict_table_year(crop, index, year, model_set):
+    """Raw monthly WPI for one year at the scenario table's inputs (not cached: only years past the table get here)."""
+    crop_thresholds = model_set.thresholds.get(crop)
+    rainfall = index.rainfall if index is not None and index.rainfall is not None else \
+        (crop_thresholds['mean_rainfall'] if crop_thresholds else 0)
+    features = build_price_features(crop, rainfall, year, range(1, 13), model_set, category=0, deviation=0)
+    with metrics.span("predict"):
+        return model_set.models[crop].predict(features)
+
+def forecast_year_window(crop, model_set):
+    """(first, last) year forecast_years() answers: the precomputed years +/- MAX_FORECAST_YEARS."""
+    cube = model_set.forecast_cubes.get(crop)
+    index = get_forecast_index(crop, model_set)
+    known = [int(y) for source in (cube, index) if source is not None and len(source.years)
+             for y in (source.years[0], source.years[-1])]
+    if not known:
+        known = [pd.Timestamp.now().year]
+    return min(known) - MAX_FORECAST_YEARS, max(known) + MAX_FORECAST_YEARS
+
+def forecast_years(crop, years, model_set, scenario="normal", rainfall=None):
+    """
+    {year: (12 monthly WPI, source)}. Scenario queries read the scenario table, rainfall
+    queries interpolate the forecast cube. Other years, and rainfall outside the cube,
+    are predicted live and given the same growth, MSP and scenario adjustment train.py
+    applied to the precomputed values, so the series carries on across the table's edge.
+    Raises ValueError for years outside forecast_year_window() (compounded growth would
+    overflow) or if that adjustment is unknown (a cube from before it was saved).
+    """
+    first, last = forecast_year_window(crop, model_set)
+    if years and (min(years) < first or max(years) > last):
+        raise ValueError(f"{crop} forecasts cover {first}-{last}")
+    cube = model_set.forecast_cubes.get(crop)
+    adjustment = cube.adjustment if cube is not None else None
+    rows = {}
+    if rainfall is not None:
+        if cube is not None:
+            rows = {year: (values, "cube") for year, values in cube.lookup(rainfall, years).items()}
+    else:
+        index = get_forecast_index(crop, model_set)
+        for year in years:
+            values = index.lookup(scenario, year) if index is not None else None
+            if values is not None:
+                rows[year] = (values, "table")
+
+    for year in years:
+        if year in rows:
+            continue
+        if adjustment is None:
+            raise ValueError(f"No precomputed {crop} forecast for {year}"
+                             + (f" at {rainfall} mm" if rainfall is not None else "")
+                             + "; retrain with train.py to forecast outside the precomputed years")
+        if rainfall is not None:
+            values = adjustment.apply(predict_year(crop, rainfall, year, model_set), year)
+        else:
+            values = adjustment.apply(predict_table_year(crop, index, year, model_set), year, scenario)
+        rows[year] = (values, "model")
+    return rows
+
+model_registry = ModelRegistry(MODEL_DIR)
+
+# -----------------------
+# Live state (latest reading + recent history per device, shared by all workers)
+# -----------------------
+# sqlite:///path (default, WAL file next to crops.db), redis://host:port/db, or memory:// (single process)
+LIVE_STATE_URL = os.environ.get("LIVE_STATE_URL", f"sqlite:///{os.path.join(DB_DIR, 'live_state.db')}")
+live_state = make_live_state(LIVE_STATE_URL)
+DEFAULT_DEVICE = "default"
+EMPTY_READING = {"temperature": 0.0, "humidity": 0.0, "soil": 0, "soil_status": "Unknown", "heat_index": None, "time": None}
+
+def request_device():
+    """?device= if given, else the device that reported most recently."""
+    return (request.args.get("device") or "").strip()[:64] or live_state.latest_device() or DEFAULT_DEVICE
+
+FLEET = "*"  # ?device=* asks /events and /api/history for every device
+
+def request_device_or_fleet():
+    """None (every device) for ?device=*, else request_device()."""
+    return None if (request.args.get("device") or "").strip() == FLEET else request_device()
+
+def latest_reading(device):
+    return live_state.latest(device) or {**EMPTY_READING, "device": device}
+
+class VersionedResponseCache:
+    """
+    Serialized JSON bodies for the polled read endpoints, valid for one version of their device.
+
+    Every reading or alert bumps live_state.version(device) for its own device only, so
+    between that device's readings a poll costs one version lookup: the cached body is
+    reused, and a client that sends the ETag back in If-None-Match gets an empty 304,
+    however busy the rest of the fleet is. The body's CRC is part of the ETag so a store
+    whose version counter restarted (memory://) cannot produce false 304s.
+    """
+    def __init__(self, maxsize=1024):
+        self._entries = LRUCache(maxsize)  # (endpoint, device) -> (version, etag, body)
+
+    def respond(self, endpoint, device, build):
+        version = live_state.version(device)  # read before building: a racing write only causes a rebuild
+        entry = self._entries.get((endpoint, device))
+        if entry is None or entry[0] != version:
+            data = build()
+            with metrics.span("json_serialize"):
+                body = app.json.dumps(data).encode("utf-8")
+            entry = (version, f"v{version}-{zlib.crc32(body):08x}", body)
+            self._entries.put((endpoint, device), entry)
+        resp = Response(entry[2], mimetype="application/json")
+        resp.set_etag(entry[1])
+        resp.headers["Cache-Control"] = "no-cache"  # browsers revalidate every poll
+        return resp.make_conditional(request)
+
+response_cache = VersionedResponseCache()
+
+# -----------------------
+# Crop recommendation rules
+# -----------------------
+# Checked in order, first match wins; a metric bound (low, high) is exclusive and None means
+# unbounded, a soil_status of None matches any status. The last rule has no conditions.
+CROP_RULES = [
+    {"key": "rice", "soil_status": "Wet", "soil": (70, None), "humidity": (50, None), "temperature": (20, 35),
+     "payload": {"name":"Rice 🌾","details":"Rice grows well in clayey soil with standing water.","dos":["Maintain water levels","Split N applications"],"donts":["Avoid sandy soils","Avoid drought during establishment"]}},
+    {"key": "wheat", "soil_status": "Dry", "soil": (50, None), "humidity": (None, 60), "temperature": (18, 30),
+     "payload": {"name":"Wheat 🌱","details":"Wheat prefers loamy soil and moderate watering.","dos":["Ensure drainage","Apply phosphorus"],"donts":["Avoid waterlogging","Don't over-irrigate"]}},
+    {"key": "maize", "soil": (40, None), "humidity": (40, None), "temperature": (22, 28),
+     "payload": {"name":"Maize 🌽","details":"Maize needs consistent moisture and full sun.","dos":["Irrigate at flowering","Control weeds early"],"donts":["Avoid acidic soils","Don't crowd plants"]}},
+    {"key": "millet", "soil": (None, 30), "temperature": (25, None),
+     "payload": {"name":"Millet 🌿","details":"Millet is drought-resistant and suited for poor soils.","dos":["Plant drought tolerant varieties","Use mulch"],"donts":["Avoid waterlogging","Don't over-fertilize"]}},
+    {"key": "potato",
+     "payload": {"name":"Potato 🥔","details":"Potatoes prefer loose, well-draining soils.","dos":["Keep soil cool and moist","Practice crop rotation"],"donts":["Avoid compacted soils","Don't let fields waterlog"]}},
+]
+RULE_METRICS = ("temperature", "humidity", "soil")
+
+class CropRuleTable:
+    """
+    CROP_RULES compiled into NumPy bounds so many readings are classified in one pass.
+
+    match() returns the index of the first matching rule per reading. Payloads (and
+    their JSON text) are built once here; callers copy them rather than mutate them.
+    Only the bounds a rule sets are compared, so like the old if-chain a NaN fails
+    the rules that test its metric and is ignored by the rest.
+    """
+    def __init__(self, rules):
+        self.keys = tuple(rule["key"] for rule in rules)
+        self.payloads = tuple(rule["payload"] for rule in rules)
+        self.payload_json = tuple(json.dumps(p) for p in self.payloads)
+        bounds = [[rule.get(m) or (None, None) for m in RULE_METRICS] for rule in rules]
+        self.low = np.array([[-np.inf if lo is None else lo for lo, _ in row] for row in bounds])   # (rules, metrics)
+        self.high = np.array([[np.inf if hi is None else hi for _, hi in row] for row in bounds])
+        self.has_low = np.array([[lo is not None for lo, _ in row] for row in bounds])
+        self.has_high = np.array([[hi is not None for _, hi in row] for row in bounds])
+        self.status = np.array([rule.get("soil_status") or "" for rule in rules])
+        self.any_status = np.array([rule.get("soil_status") is None for rule in rules])
+        if self.has_low[-1].any() or self.has_high[-1].any() or not self.any_status[-1]:
+            raise ValueError("the last crop rule must match every reading")
+        # plain-tuple copy of the set bounds, as (metric index, bound), for single readings,
+        # where NumPy call overhead dominates
+        self._scalar_rules = [(tuple((m, lo) for m, (lo, _) in enumerate(row) if lo is not None),
+                               tuple((m, hi) for m, (_, hi) in enumerate(row) if hi is not None),
+                               rule.get("soil_status"), rule["payload"])
+                              for row, rule in zip(bounds, rules)]
+
+    def match(self, temperature, humidity, soil, soil_status):
+        values = np.column_stack([np.asarray(temperature, dtype=float), np.asarray(humidity, dtype=float),
+                                  np.asarray(soil, dtype=float)])[None, :, :]                       # (1, n, metrics)
+        inside = (((values > self.low[:, None, :]) | ~self.has_low[:, None, :]) &
+                  ((values < self.high[:, None, :]) | ~self.has_high[:, None, :])).all(axis=2)    # (rules, n)
+        status = np.asarray(soil_status, dtype=str)
+        inside &= self.any_status[:, None] | (self.status[:, None] == status[None, :])
+        inside[-1] = True
+        return inside.argmax(axis=0)
+
+    def recommend(self, temp, hum, soil, soil_status):
+        values = (temp, hum, soil)
+        for lows, highs, status, payload in self._scalar_rules:
+            if ((status is None or status == soil_status) and all(values[m] > lo for m, lo in lows)
+                    and all(values[m] < hi for m, hi in highs)):
+                return payload
+        return self.payloads[-1]
+
+crop_rules = CropRuleTable(CROP_RULES)
+
 def recommend_crop(temp, hum, soil, soil_status):
-    if soil_status == "Wet" and soil > 70 and hum > 50 and 20 < temp < 35:
-        return {"name":"Rice 🌾","details":"Rice grows well in clayey soil with standing water.","dos":["Maintain water levels","Split N applications"],"donts":["Avoid sandy soils","Avoid drought during establishment"]}
-    if soil_status == "Dry" and soil > 50 and hum < 60 and 18 < temp < 30:
-        return {"name":"Wheat 🌱","details":"Wheat prefers loamy soil and moderate watering.","dos":["Ensure drainage","Apply phosphorus"],"donts":["Avoid waterlogging","Don't over-irrigate"]}
-    if soil > 40 and hum > 40 and 22 < temp < 28:
-        return {"name":"Maize 🌽","details":"Maize needs consistent moisture and full sun.","dos":["Irrigate at flowering","Control weeds early"],"donts":["Avoid acidic soils","Don't crowd plants"]}
-    if soil < 30 and temp > 25:
-        return {"name":"Millet 🌿","details":"Millet is drought-resistant and suited for poor soils.","dos":["Plant drought tolerant varieties","Use mulch"],"donts":["Avoid waterlogging","Don't over-fertilize"]}
-    return {"name":"Potato 🥔","details":"Potatoes prefer loose, well-draining soils.","dos":["Keep soil cool and moist","Practice crop rotation"],"donts":["Avoid compacted soils","Don't let fields waterlog"]}
+    return crop_rules.recommend(temp, hum, soil, soil_status)
 
 # -----------------------
 # Routes
@@ -165,137 +1122,772 @@ def recommend_crop(temp, hum, soil, soil_status):
 def home():
     return render_template("index.html")
 
-@app.route("/sensor", methods=["POST"])
-def sensor():
-    # API-key check
-    api_key = request.headers.get("X-API-KEY", "")
-    if api_key != SENSOR_API_KEY:
-        return jsonify({"status":"error","message":"unauthorized"}), 401
+# -----------------------
+# Server-sent events
+# -----------------------
+class EventBroadcaster:
+    """
+    Fan-out of server-sent events to the /events subscribers of this process.
 
-    data = request.get_json(force=True, silent=True)
-    if not data:
-        return jsonify({"status":"error","message":"invalid json"}), 400
+    publish() serializes an event once; every subscriber queue receives the same
+    bytes. A subscriber that falls max_queue events behind is dropped and its
+    browser reconnects (and gets a fresh snapshot). Subscribers may follow a
+    single device; events published without a device go to everyone.
+
+    Each open stream holds one of the worker's threads for as long as it is
+    connected, so at most max_subscribers are accepted; subscribe() returns None
+    beyond that and the dashboard polls instead.
+    """
+    def __init__(self, max_queue=100, max_subscribers=None):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._subscribers = {}  # queue -> device (None = all devices)
+        self._lock = threading.Lock()
+
+    def subscribe(self, device=None):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers[q] = device
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.pop(q, None)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    @staticmethod
+    def format(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+    def publish(self, event, data, device=None):
+        with self._lock:
+            subscribers = [q for q, wanted in self._subscribers.items()
+                           if wanted is None or device is None or wanted == device]
+        if not subscribers:
+            return
+        with metrics.span("json_serialize"):
+            payload = self.format(event, data)
+        for q in subscribers:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                # too far behind: drop it; the None sentinel ends its stream
+                self.unsubscribe(q)
+                try:
+                    q.get_nowait()
+                    q.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+class LiveRelay:
+    """
+    Tails the live_state event log and republishes it to this worker's subscribers.
+
+    Readings and alerts are recorded in live_state by whichever worker ingested
+    them, so every worker's /events streams see every device. One recommendation
+    per device is sent after each polled batch of readings.
+    """
+    def __init__(self, store, broadcaster, poll_interval=0.5):
+        self.store = store
+        self.broadcaster = broadcaster
+        self.poll_interval = poll_interval
+        self._thread = BackgroundThread(self._run, "live-relay")
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        last = self.store.version()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if not self.broadcaster.has_subscribers():
+                    last = self.store.version()
+                    continue
+                last = self.relay_since(last)
+            except Exception as e:
+                print("❌ Live relay failed:", e)
+
+    def relay_since(self, version):
+        updated = []
+        for version, kind, device, data in self.store.events_since(version):
+            self.broadcaster.publish(kind, data, device)
+            if kind == "reading" and device not in updated:
+                updated.append(device)
+        for device in updated:
+            self.broadcaster.publish("recommendation", recommendation_payload(device), device)
+        return version
+
+# /events streams per worker; keep it well below gunicorn's thread count (GUNICORN_THREADS)
+# so sensor posts and page loads still get a thread
+SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 8))
+broadcaster = EventBroadcaster(max_subscribers=SSE_MAX_SUBSCRIBERS)
+live_relay = LiveRelay(live_state, broadcaster)
+SSE_KEEPALIVE_SECONDS = 15
+
+# -----------------------
+# Sensor ingestion (shared by /sensor and /sensor/batch)
+# -----------------------
+MAX_BATCH_SIZE = 500
+MAX_READING_AGE_MS = 7 * 86400 * 1000  # oldest buffered reading accepted (age_ms)
+
+def api_key_valid(key):
+    return key == SENSOR_API_KEY
 
+def sensor_authorized():
+    return api_key_valid(request.headers.get("X-API-KEY", ""))
+
+def parse_reading(data, now_utc):
+    """Validate one ESP32 payload and return clean values; raises ValueError on bad input."""
+    if not isinstance(data, dict):
+        raise ValueError("invalid json")
+    device = str(data.get("device") or data.get("device_id") or DEFAULT_DEVICE).strip()[:64] or DEFAULT_DEVICE
     # Accept multiple key names for compatibility
     try:
         temp = float(data.get("temperature", data.get("temp", 0.0)))
         hum = float(data.get("humidity", data.get("hum", 0.0)))
         # prefer 'soil' otherwise use 'soil_analog'
-        soil = int(data.get("soil") if data.get("soil") is not None else data.get("soil_analog", 0))
+        soil = float(data.get("soil") if data.get("soil") is not None else data.get("soil_analog", 0))
         # prefer 'soil_status' otherwise 'soil_digital'
-        soil_status = data.get("soil_status") or data.get("soil_digital") or "Unknown"
-        heat_index = None
-        # accept heat_index if sent
-        if "heat_index" in data:
-            try:
-                heat_index = float(data.get("heat_index"))
-            except:
-                heat_index = None
-    except Exception:
-        return jsonify({"status":"error","message":"bad values"}), 400
-
-    # store UTC now in DB but return local IST strings
-    now_utc = datetime.utcnow()
-    reading = SensorReading(temperature=temp, humidity=hum, soil=soil, soil_status=soil_status, timestamp=now_utc)
-    db.session.add(reading)
-    db.session.commit()
-
-    # Create local IST timestamp string
-    try:
-        local_str = now_utc.replace(tzinfo=timezone.utc).astimezone(ZoneInfo("Asia/Kolkata")).strftime("%Y-%m-%d %H:%M:%S")
-    except Exception:
-        # fallback naive formatting if zoneinfo not available
-        local_str = now_utc.strftime("%Y-%m-%d %H:%M:%S")
-
-    # update caches (include heat_index if present)
-    entry = {
-        "temperature": round(temp, 1),
-        "humidity": round(hum, 0),
+        soil_status = str(data.get("soil_status") or data.get("soil_digital") or "Unknown")[:16]
+        # buffered readings carry their age (ms since sampled) so batches keep real sample times
+        age_ms = float(data.get("age_ms", 0) or 0)
+        # JSON NaN/Infinity (and "nan" strings) would fail the insert or the rule table later
+        if not all(math.isfinite(v) for v in (temp, hum, soil, age_ms)):
+            raise ValueError
+        if not 0 <= age_ms <= MAX_READING_AGE_MS:
+            raise ValueError
+        soil = int(soil)
+        timestamp = now_utc - timedelta(milliseconds=age_ms)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("bad values")
+    heat_index = None
+    # accept heat_index if sent
+    if data.get("heat_index") is not None:
+        try:
+            heat_index = float(data.get("heat_index"))
+        except (TypeError, ValueError):
+            heat_index = None
+        if heat_index is not None and not math.isfinite(heat_index):
+            heat_index = None
+    return {
+        "temperature": temp,
+        "humidity": hum,
         "soil": soil,
         "soil_status": soil_status,
-        "heat_index": (round(heat_index,1) if heat_index is not None else None),
-        "time": local_str
+        "heat_index": heat_index,
+        "timestamp": timestamp,
+        "device": device,
     }
-    latest_data.update(entry)
-    history_cache.appendleft(entry)
 
-    # create alert & notifications if threshold crosses
-    create_alert_if_needed(reading)
+def batch_items(data):
+    """The readings list of a /sensor/batch body (a list or {"readings": [...]}) and its batch-level device."""
+    items = data.get("readings") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ValueError("invalid json")
+    return items, (data.get("device") if isinstance(data, dict) else None)
+
+def parse_batch(items, batch_device, now_utc):
+    """Validate every reading of a batch; returns (parsed, errors) with errors as [{"index", "message"}]."""
+    parsed, errors = [], []
+    for i, item in enumerate(items):
+        try:
+            # a top-level "device" applies to readings that do not name their own
+            if batch_device and isinstance(item, dict) and not (item.get("device") or item.get("device_id")):
+                item = {**item, "device": batch_device}
+            parsed.append(parse_reading(item, now_utc))
+        except ValueError as e:
+            errors.append({"index": i, "message": str(e)})
+    return parsed, errors
+
+def to_local_str(ts):
+    """Format a naive-UTC DB timestamp as an IST string."""
+    if ts is None:
+        return ""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+def ingest_readings(parsed):
+    """Store already-validated readings with one bulk insert + commit, then update live state and alerts."""
+    readings = [
+        SensorReading(temperature=p["temperature"], humidity=p["humidity"], soil=p["soil"],
+                      soil_status=p["soil_status"], timestamp=p["timestamp"], device=p["device"])
+        for p in parsed
+    ]
+    db.session.add_all(readings)
+    db.session.flush()
+    # open/coalesce alerts in the same transaction; notifications go out from the dispatcher thread
+    by_device = {}
+    for r in readings:
+        by_device.setdefault(r.device, []).append(r)
+    opened = []
+    for device, device_readings in by_device.items():
+        opened += alert_engine.evaluate(device_readings, sensor=device)
+    update_rollups(readings)
+    with metrics.span("db_commit"):
+        db.session.commit()
+    metrics.inc("readings_accepted_total", len(readings))
+    for alert in opened:
+        metrics.inc("alerts_raised_total", condition=alert.condition)
+    if opened:
+        alert_dispatcher.wake()
+
+    # live state gets entries oldest-first (with heat_index if present); LiveRelay pushes them to /events
+    entries = {}
+    for p in sorted(parsed, key=lambda p: p["timestamp"]):
+        entries.setdefault(p["device"], []).append({
+            "temperature": round(p["temperature"], 1),
+            "humidity": round(p["humidity"], 0),
+            "soil": p["soil"],
+            "soil_status": p["soil_status"],
+            "heat_index": (round(p["heat_index"], 1) if p["heat_index"] is not None else None),
+            "time": to_local_str(p["timestamp"]),
+            "device": p["device"],
+        })
+    for device, device_entries in entries.items():
+        live_state.record_readings(device, device_entries)
+    for alert in opened:
+        live_state.record_event("alert", alert.sensor, {"id": alert.id, "message": alert.message,
+                                                        "time": to_local_str(alert.created_at),
+                                                        "device": alert.sensor})
+    return readings
 
+@app.route("/sensor", methods=["POST"])
+def sensor():
+    # API-key check
+    if not sensor_authorized():
+        return jsonify({"status":"error","message":"unauthorized"}), 401
+
+    data = request.get_json(force=True, silent=True)
+    if not data:
+        return jsonify({"status":"error","message":"invalid json"}), 400
+    try:
+        parsed = parse_reading(data, datetime.utcnow())
+    except ValueError as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+
+    ingest_readings([parsed])
     return jsonify({"status":"ok"})
 
+@app.route("/sensor/batch", methods=["POST"])
+def sensor_batch():
+    """Accept a list of readings (or {"readings": [...]}) and store all valid ones in one commit."""
+    if not sensor_authorized():
+        return jsonify({"status":"error","message":"unauthorized"}), 401
+
+    data = request.get_json(force=True, silent=True)
+    try:
+        items, batch_device = batch_items(data)
+    except ValueError as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"status":"error","message":f"batch larger than {MAX_BATCH_SIZE}"}), 413
+
+    # validate everything up front, then write the good ones in a single transaction
+    parsed, errors = parse_batch(items, batch_device, datetime.utcnow())
+    if not parsed:
+        return jsonify({"status":"error","message":"no valid readings","accepted":0,"errors":errors}), 400
+
+    ingest_readings(parsed)
+    return jsonify({"status": "partial" if errors else "ok", "accepted": len(parsed), "errors": errors})
+
 @app.route("/latest-sensor")
 def latest_sensor():
     # ensure 'time' is present (already IST when sensor posted)
-    return jsonify(latest_data)
+    device = request_device()
+    return response_cache.respond("latest", device, lambda: latest_reading(device))
 
 @app.route("/history")
 def get_history():
-    # Prefer in-memory recent cache (includes heat_index & local times)
-    if len(history_cache) > 0:
-        return jsonify(list(history_cache))
+    device = request_device()
+    return response_cache.respond("history", device, lambda: history_payload(device))
+
+def history_payload(device):
+    # Prefer the live ring buffer (includes heat_index & local times)
+    recent = live_state.history(device)
+    if recent:
+        return recent
     # fallback to DB rows (convert UTC to IST)
-    rows = SensorReading.query.order_by(SensorReading.timestamp.desc()).limit(200).all()
+    rows = (SensorReading.query.filter(SensorReading.device == device)
+            .order_by(SensorReading.timestamp.desc()).limit(200).all())
     out = []
     for r in rows:
-        ts = r.timestamp
-        if ts is None:
-            tstr = ""
-        else:
-            try:
-                # treat stored timestamp as UTC if naive
-                if ts.tzinfo is None:
-                    ts_utc = ts.replace(tzinfo=timezone.utc)
-                else:
-                    ts_utc = ts
-                local = ts_utc.astimezone(ZoneInfo("Asia/Kolkata"))
-                tstr = local.strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                tstr = r.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        tstr = to_local_str(r.timestamp)
         out.append({
             "temperature": r.temperature,
             "humidity": r.humidity,
             "soil": r.soil,
             "soil_status": r.soil_status,
-            "heat_index": None,      # DB lacks heat_index column; history_cache will have it for recent entries
-            "time": tstr
+            "heat_index": None,      # DB lacks heat_index column; live_state has it for recent entries
+            "time": tstr,
+            "device": r.device,
         })
-    return jsonify(out)
+    return out
+
+# -----------------------
+# Rollups and windowed history aggregation
+# -----------------------
+HISTORY_BUCKETS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+HISTORY_DEFAULT_WINDOW = {"1m": timedelta(hours=2), "5m": timedelta(hours=12),
+                          "1h": timedelta(days=7), "1d": timedelta(days=90)}
+MAX_HISTORY_BUCKETS = 5000
+IST_OFFSET_SECONDS = 19800  # buckets are aligned to IST (UTC+5:30, no DST) so days/hours match the UI
+# stored rollup resolutions; other buckets are re-aggregated from the finest one that divides them
+ROLLUP_RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+ROLLUP_METRICS = ("temperature", "humidity", "soil")
+
+def parse_time_arg(value):
+    """ISO 8601 query arg -> naive UTC datetime; values without an offset are taken as IST."""
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=LOCAL_TZ)
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+def epoch_seconds(ts):
+    return int(ts.replace(tzinfo=timezone.utc).timestamp())
+
+def bucket_start(epoch, seconds):
+    return (epoch + IST_OFFSET_SECONDS) // seconds * seconds - IST_OFFSET_SECONDS
+
+def bucket_start_expr(column, seconds):
+    """SQL version of bucket_start() for a naive-UTC DateTime column."""
+    if db.engine.dialect.name == "sqlite":
+        epoch = db.cast(db.func.strftime("%s", column), db.Integer)
+        return (epoch + IST_OFFSET_SECONDS) // seconds * seconds - IST_OFFSET_SECONDS
+    epoch = db.func.floor(db.extract("epoch", column))
+    return db.func.floor((epoch + IST_OFFSET_SECONDS) / seconds) * seconds - IST_OFFSET_SECONDS
+
+def rollup_insert(rows):
+    """INSERT .. ON CONFLICT that merges rows into existing buckets (SQLite and Postgres)."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(SensorRollup).values(rows)
+    table, new = SensorRollup.__table__.c, stmt.excluded
+    merged = {"count": table.count + new["count"]}
+    for metric in ROLLUP_METRICS:
+        lo, hi = f"{metric}_min", f"{metric}_max"
+        merged[f"{metric}_sum"] = table[f"{metric}_sum"] + new[f"{metric}_sum"]
+        merged[lo] = db.case((new[lo] < table[lo], new[lo]), else_=table[lo])
+        merged[hi] = db.case((new[hi] > table[hi], new[hi]), else_=table[hi])
+    return stmt.on_conflict_do_update(index_elements=["resolution", "device", "bucket_start"], set_=merged)
+
+def update_rollups(readings):
+    """Fold a batch of readings into the rollups: aggregate in Python, then one upsert per batch."""
+    buckets = {}
+    for reading in readings:
+        epoch = epoch_seconds(reading.timestamp)
+        device = reading.device or DEFAULT_DEVICE
+        for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+            key = (resolution, device, bucket_start(epoch, seconds))
+            row = buckets.get(key)
+            if row is None:
+                row = buckets[key] = {"resolution": resolution, "device": device, "bucket_start": key[2], "count": 0}
+                for metric in ROLLUP_METRICS:
+                    value = float(getattr(reading, metric))
+                    row.update({f"{metric}_sum": 0.0, f"{metric}_min": value, f"{metric}_max": value})
+            row["count"] += 1
+            for metric in ROLLUP_METRICS:
+                value = float(getattr(reading, metric))
+                row[f"{metric}_sum"] += value
+                row[f"{metric}_min"] = min(row[f"{metric}_min"], value)
+                row[f"{metric}_max"] = max(row[f"{metric}_max"], value)
+    if buckets:
+        db.session.execute(rollup_insert(list(buckets.values())))
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute rollups from raw readings, for all time or the whole buckets covering [start, end)."""
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        bucket = bucket_start_expr(SensorReading.timestamp, seconds)
+        where = []
+        delete = db.delete(SensorRollup).where(SensorRollup.resolution == resolution)
+        if start is not None:
+            # widen to whole buckets so partially covered ones are rebuilt completely
+            first = bucket_start(epoch_seconds(start), seconds)
+            where.append(SensorReading.timestamp >= datetime.fromtimestamp(first, timezone.utc).replace(tzinfo=None))
+            delete = delete.where(SensorRollup.bucket_start >= first)
+        if end is not None:
+            last = bucket_start(epoch_seconds(end) - 1, seconds) + seconds
+            where.append(SensorReading.timestamp < datetime.fromtimestamp(last, timezone.utc).replace(tzinfo=None))
+            delete = delete.where(SensorRollup.bucket_start < last)
+        device = db.func.coalesce(SensorReading.device, DEFAULT_DEVICE)
+        columns = [db.literal(resolution), device, bucket, db.func.count()]
+        for metric in ROLLUP_METRICS:
+            column = getattr(SensorReading, metric)
+            columns += [db.func.sum(column), db.func.min(column), db.func.max(column)]
+        select = db.select(*columns).where(*where).group_by(device, bucket)
+        target = ["resolution", "device", "bucket_start", "count"]
+        for metric in ROLLUP_METRICS:
+            target += [f"{metric}_sum", f"{metric}_min", f"{metric}_max"]
+        db.session.execute(delete)
+        db.session.execute(db.insert(SensorRollup).from_select(target, select))
+    db.session.commit()
+
+@app.cli.command("rollup-backfill")
+@click.option("--from", "start", default=None, help="ISO start time (IST if no offset); default: all rows")
+@click.option("--to", "end", default=None, help="ISO end time (IST if no offset)")
+def rollup_backfill(start, end):
+    """Rebuild sensor rollups from the raw SensorReading table."""
+    rebuild_rollups(parse_time_arg(start) if start else None, parse_time_arg(end) if end else None)
+    click.echo(f"rollups rebuilt: {SensorRollup.query.count()} buckets")
+
+def migrate_device_rollups():
+    """
+    Rollups used to be fleet-wide, in sensor_rollup; rebuild them per device from the
+    readings once. Buckets with no raw readings left (archived) are carried over as they
+    were, under DEFAULT_DEVICE, so fleet-wide history still covers them.
+    """
+    if "sensor_rollup" not in db.inspect(db.engine).get_table_names():
+        return
+    print("🔄 Rebuilding sensor rollups per device (one-time)...")
+    rebuild_rollups()
+    columns = ["resolution", "bucket_start", "count"] + [f"{m}_{agg}" for m in ROLLUP_METRICS for agg in ("sum", "min", "max")]
+    with db.engine.begin() as conn:
+        conn.execute(db.text(
+            f"INSERT INTO sensor_device_rollup (device, {', '.join(columns)}) "
+            f"SELECT :device, {', '.join(columns)} FROM sensor_rollup old WHERE NOT EXISTS "
+            "(SELECT 1 FROM sensor_device_rollup new "
+            "WHERE new.resolution = old.resolution AND new.bucket_start = old.bucket_start)"
+        ), {"device": DEFAULT_DEVICE})
+        conn.execute(db.text("DROP TABLE IF EXISTS sensor_rollup"))
+
+with app.app_context(), schema_lock():
+    migrate_device_rollups()
+
+def aggregate_history(start, end, seconds, device=None):
+    """
+    min/mean/max per metric for each bucket in [start, end), oldest first, read from the
+    rollups of one device, or of the whole fleet if device is None.
+    """
+    # finest stored resolution that divides the requested bucket
+    resolution = max((r for r, s in ROLLUP_RESOLUTIONS.items() if seconds % s == 0), key=ROLLUP_RESOLUTIONS.get)
+    bucket = ((SensorRollup.bucket_start + IST_OFFSET_SECONDS) // seconds * seconds - IST_OFFSET_SECONDS).label("bucket")
+    columns = [bucket, db.func.sum(SensorRollup.count)]
+    for metric in ROLLUP_METRICS:
+        columns += [db.func.min(getattr(SensorRollup, f"{metric}_min")),
+                    db.func.sum(getattr(SensorRollup, f"{metric}_sum")),
+                    db.func.max(getattr(SensorRollup, f"{metric}_max"))]
+    where = [SensorRollup.resolution == resolution,
+             SensorRollup.bucket_start >= bucket_start(epoch_seconds(start), seconds),
+             SensorRollup.bucket_start < epoch_seconds(end)]
+    if device is not None:
+        where.append(SensorRollup.device == device)
+    rows = db.session.execute(
+        db.select(*columns)
+        .where(*where)
+        .group_by(bucket)
+        .order_by(bucket)
+    ).all()
+    points = []
+    for row in rows:
+        bucket_utc = datetime.fromtimestamp(int(row[0]), timezone.utc).replace(tzinfo=None)
+        count = int(row[1])
+        point = {"ts": int(row[0]), "time": to_local_str(bucket_utc), "count": count}
+        for i, metric in enumerate(ROLLUP_METRICS):
+            lo, total, hi = row[2 + 3 * i: 5 + 3 * i]
+            point[metric] = {"min": round(lo, 2), "mean": round(total / count, 2), "max": round(hi, 2)}
+        points.append(point)
+    return points
+
+@app.route("/api/history")
+def api_history():
+    """
+    Aggregated readings: ?bucket=1m|5m|1h|1d&from=&to= (ISO 8601; no offset means IST)
+    for ?device= (default: the most recent reporter, as on /recommend), or ?device=* for
+    the whole fleet.
+    """
+    bucket = request.args.get("bucket", "5m")
+    if bucket not in HISTORY_BUCKETS:
+        return jsonify({"status":"error","message":"bucket must be one of " + ", ".join(HISTORY_BUCKETS)}), 400
+    seconds = HISTORY_BUCKETS[bucket]
+    try:
+        end = parse_time_arg(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+        start = parse_time_arg(request.args["from"]) if request.args.get("from") else end - HISTORY_DEFAULT_WINDOW[bucket]
+    except ValueError:
+        return jsonify({"status":"error","message":"bad time"}), 400
+    if end <= start:
+        return jsonify({"status":"error","message":"'to' must be after 'from'"}), 400
+    if (end - start).total_seconds() / seconds > MAX_HISTORY_BUCKETS:
+        return jsonify({"status":"error","message":f"more than {MAX_HISTORY_BUCKETS} buckets; use a larger bucket"}), 400
+    device = request_device_or_fleet()
+    return jsonify({"bucket": bucket, "device": device or FLEET, "from": to_local_str(start), "to": to_local_str(end),
+                    "points": aggregate_history(start, end, seconds, device)})
 
 # existing admin/download endpoints remain unchanged (admin-protected download)
+EXPORT_PAGE_SIZE = 5000
+
+def iter_history_csv(start=None, end=None, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yield the sensor history as CSV text chunks, newest first, one chunk per page.
+
+    Pages are fetched with keyset pagination on (timestamp, id), so memory stays at
+    one page no matter how large the table is.
+    """
+    buf = io.StringIO()
+    cw = csv.writer(buf)
+    cw.writerow(["timestamp","temperature","humidity","soil","soil_status","recommendation"])
+    columns = (SensorReading.id, SensorReading.timestamp, SensorReading.temperature,
+               SensorReading.humidity, SensorReading.soil, SensorReading.soil_status)
+    query = db.select(*columns).where(SensorReading.timestamp.is_not(None))
+    if start is not None:
+        query = query.where(SensorReading.timestamp >= start)
+    if end is not None:
+        query = query.where(SensorReading.timestamp < end)
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.where(db.or_(SensorReading.timestamp < last.timestamp,
+                                     db.and_(SensorReading.timestamp == last.timestamp,
+                                             SensorReading.id < last.id)))
+        rows = db.session.execute(
+            page.order_by(SensorReading.timestamp.desc(), SensorReading.id.desc()).limit(page_size)
+        ).all()
+        # one vectorized rule pass per page
+        crops = crop_rules.match([r.temperature for r in rows], [r.humidity for r in rows],
+                                 [r.soil for r in rows], [r.soil_status for r in rows]) if rows else []
+        for r, crop in zip(rows, crops):
+            # convert to IST for download as well
+            cw.writerow([to_local_str(r.timestamp), r.temperature, r.humidity, r.soil, r.soil_status,
+                         crop_rules.keys[crop]])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        if len(rows) < page_size:
+            break
+        last = rows[-1]
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
 @app.route("/download-history")
 def download_history():
+    """Streamed CSV of all readings; optional ?from=&to= (ISO, IST if no offset) and ?gzip=1."""
     # admin only - simple session auth
     if not session.get("admin_authenticated"):
         return redirect(url_for("admin"))
-    rows = SensorReading.query.order_by(SensorReading.timestamp.desc()).all()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["timestamp","temperature","humidity","soil","soil_status"])
-    for r in rows:
-        # convert to IST for download as well
-        ts = r.timestamp
-        try:
-            if ts.tzinfo is None:
-                ts_utc = ts.replace(tzinfo=timezone.utc)
-            else:
-                ts_utc = ts
-            local = ts_utc.astimezone(ZoneInfo("Asia/Kolkata"))
-            tstr = local.strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            tstr = r.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        cw.writerow([tstr, r.temperature, r.humidity, r.soil, r.soil_status])
-    mem = io.BytesIO()
-    mem.write(si.getvalue().encode('utf-8'))
-    mem.seek(0)
-    return send_file(mem, mimetype="text/csv", as_attachment=True, download_name="sensor_history.csv")
-
-# admin and price routes unchanged (kept from your file)
+    try:
+        start = parse_time_arg(request.args["from"]) if request.args.get("from") else None
+        end = parse_time_arg(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"status":"error","message":"bad time"}), 400
+
+    chunks = iter_history_csv(start, end)
+    if request.args.get("gzip") == "1":
+        body, mimetype, filename = gzip_chunks(chunks), "application/gzip", "sensor_history.csv.gz"
+    else:
+        body, mimetype, filename = (c.encode("utf-8") for c in chunks), "text/csv", "sensor_history.csv"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# -----------------------
+# Retention: archive old raw readings into per-day gzip CSV files
+# -----------------------
+ARCHIVE_DIR = os.path.join(DB_DIR, "archive")
+ARCHIVE_COLUMNS = ["id", "timestamp_utc", "device", "temperature", "humidity", "soil", "soil_status"]
+
+def archive_readings(cutoff, out_dir=ARCHIVE_DIR, page_size=EXPORT_PAGE_SIZE):
+    """
+    Move SensorReading rows older than cutoff (naive UTC) into out_dir/readings-YYYY-MM-DD.csv.gz
+    (one file per IST day, appended to on later runs) and delete them from the database.
+
+    Each page is written and closed before its rows are deleted, so an interrupted run
+    at worst leaves a few rows both archived and still in the table. Rollups are kept,
+    so /api/history still covers archived periods.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    columns = (SensorReading.id, SensorReading.timestamp, SensorReading.device, SensorReading.temperature,
+               SensorReading.humidity, SensorReading.soil, SensorReading.soil_status)
+    archived = 0
+    while True:
+        rows = db.session.execute(
+            db.select(*columns).where(SensorReading.timestamp < cutoff)
+            .order_by(SensorReading.timestamp, SensorReading.id).limit(page_size)
+        ).all()
+        if not rows:
+            break
+        by_day = {}
+        for r in rows:
+            by_day.setdefault(to_local_str(r.timestamp)[:10], []).append(r)
+        for day, day_rows in by_day.items():
+            path = os.path.join(out_dir, f"readings-{day}.csv.gz")
+            new_file = not os.path.exists(path)
+            # appending adds a gzip member; gzip readers treat the members as one stream
+            with gzip.open(path, "at", newline="") as f:
+                cw = csv.writer(f)
+                if new_file:
+                    cw.writerow(ARCHIVE_COLUMNS)
+                for r in day_rows:
+                    cw.writerow([r.id, r.timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"), r.device,
+                                 r.temperature, r.humidity, r.soil, r.soil_status])
+        ids = [r.id for r in rows]
+        # alerts keep their message and times; only the link to the raw reading goes
+        db.session.execute(db.update(Alert).where(Alert.reading_id.in_(ids)).values(reading_id=None))
+        db.session.execute(db.delete(SensorReading).where(SensorReading.id.in_(ids)))
+        db.session.commit()
+        archived += len(rows)
+    return archived
+
+@app.cli.command("archive-readings")
+@click.option("--older-than", "days", type=int, required=True, help="archive readings older than this many days")
+@click.option("--out", "out_dir", default=ARCHIVE_DIR, show_default=True, help="directory for the .csv.gz files")
+@click.option("--vacuum", is_flag=True, help="VACUUM the SQLite file afterwards to return space to the OS")
+def archive_readings_command(days, out_dir, vacuum):
+    """Archive raw sensor readings older than N days to compressed per-day files."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = archive_readings(cutoff, out_dir)
+    if vacuum and db.engine.dialect.name == "sqlite":
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(db.text("VACUUM"))
+    click.echo(f"archived {archived} readings older than {cutoff:%Y-%m-%d %H:%M} UTC to {out_dir}")
+
+# -----------------------
+# Admin alert console
+# -----------------------
+ALERT_PAGE_SIZE = 50
+MAX_ALERT_PAGE_SIZE = 500
+MAX_BULK_RESOLVE = 10000
+ALERT_STATES = ("open", "resolved", "all")
+OTHER_CONDITION = "other"  # count bucket and ?condition= value for alerts without a condition
+
+def alert_filters(args, state=None):
+    """
+    WHERE clauses for ?state=open|resolved|all&from=&to=&condition=&sensor= (from/to as in
+    /api/history). args may also be a JSON body. Raises ValueError on bad values.
+    """
+    for key in ("state", "from", "to", "condition", "sensor"):
+        if args.get(key) is not None and not isinstance(args[key], str):
+            raise ValueError(f"{key} must be a string")
+    state = state or args.get("state") or "open"
+    if state not in ALERT_STATES:
+        raise ValueError("state must be one of " + ", ".join(ALERT_STATES))
+    clauses = [Alert.created_at.is_not(None)]
+    if state == "open":
+        clauses.append(Alert.resolved.is_(False))  # ix_alert_open_created_at
+    elif state == "resolved":
+        clauses.append(Alert.resolved.is_(True))
+    if args.get("from"):
+        clauses.append(Alert.created_at >= parse_time_arg(args["from"]))
+    if args.get("to"):
+        clauses.append(Alert.created_at < parse_time_arg(args["to"]))
+    if args.get("condition") == OTHER_CONDITION:
+        clauses.append(Alert.condition.is_(None))
+    elif args.get("condition"):
+        clauses.append(Alert.condition == args["condition"])
+    if args.get("sensor"):
+        clauses.append(Alert.sensor == args["sensor"])
+    return clauses
+
+def alert_cursor(alert):
+    return f"{alert.created_at.isoformat()},{alert.id}"
+
+def list_alerts(clauses, before=None, limit=ALERT_PAGE_SIZE):
+    """
+    One page of alerts, newest first, and the cursor for the next page (None on the last).
+    Keyset pagination on (created_at, id): ?before=<cursor> continues after that alert,
+    so a page costs the same however far back it is.
+    """
+    query = db.select(Alert).where(*clauses)
+    if before:
+        ts, _, alert_id = before.partition(",")
+        ts, alert_id = datetime.fromisoformat(ts), int(alert_id)
+        query = query.where(db.or_(Alert.created_at < ts,
+                                   db.and_(Alert.created_at == ts, Alert.id < alert_id)))
+    alerts = db.session.execute(
+        query.order_by(Alert.created_at.desc(), Alert.id.desc()).limit(limit + 1)
+    ).scalars().all()
+    next_cursor = alert_cursor(alerts[limit - 1]) if len(alerts) > limit else None
+    return alerts[:limit], next_cursor
+
+def alert_counts(clauses):
+    """{condition: count} over the same filters (alerts from before conditions were recorded count as OTHER_CONDITION)."""
+    rows = db.session.execute(
+        db.select(Alert.condition, db.func.count()).where(*clauses).group_by(Alert.condition)
+    ).all()
+    return {condition or OTHER_CONDITION: n for condition, n in rows}
+
+def alert_json(alert):
+    return {"id": alert.id, "message": alert.message, "sensor": alert.sensor, "condition": alert.condition,
+            "created_at": to_local_str(alert.created_at), "last_seen_at": to_local_str(alert.last_seen_at),
+            "trigger_count": alert.trigger_count or 1, "resolved": bool(alert.resolved),
+            "notify_status": alert.notify_status}
+
 @app.route("/admin")
 def admin():
     authenticated = session.get("admin_authenticated", False)
-    alerts = Alert.query.order_by(Alert.created_at.desc()).all() if authenticated else []
-    return render_template("admin.html", authenticated=authenticated, alerts=alerts)
+    if not authenticated:
+        return render_template("admin.html", authenticated=False, alerts=[])
+    try:
+        clauses = alert_filters(request.args)
+        alerts, next_cursor = list_alerts(clauses, request.args.get("before"))
+    except ValueError as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+    filters = {k: request.args.get(k, "") for k in ("state", "from", "to", "condition", "sensor")}
+    filters["state"] = filters["state"] or "open"
+    return render_template("admin.html", authenticated=True, alerts=alerts, next_cursor=next_cursor,
+                           counts=alert_counts(clauses), filters=filters, states=ALERT_STATES)
+
+@app.route("/admin/alerts")
+def admin_alerts():
+    """JSON listing for the console: the /admin filters plus ?before=<cursor>&limit=."""
+    if not session.get("admin_authenticated"):
+        return jsonify({"status":"error","message":"unauthorized"}), 401
+    try:
+        limit = min(max(int(request.args.get("limit", ALERT_PAGE_SIZE)), 1), MAX_ALERT_PAGE_SIZE)
+        clauses = alert_filters(request.args)
+        alerts, next_cursor = list_alerts(clauses, request.args.get("before"), limit)
+    except ValueError as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+    return jsonify({"alerts": [alert_json(a) for a in alerts], "next": next_cursor,
+                    "counts": alert_counts(clauses)})
+
+@app.route("/admin/alerts/resolve", methods=["POST"])
+def bulk_resolve_alerts():
+    """
+    Resolve many alerts with one UPDATE. JSON {"ids": [...]} resolves those alerts;
+    {"condition", "sensor", "from", "to"} (at least one) resolves every open alert matching
+    them. The admin page posts the same as a form and is redirected back.
+    """
+    if not session.get("admin_authenticated"):
+        return jsonify({"status":"error","message":"unauthorized"}), 401
+    form = not request.is_json
+    data = request.form if form else (request.get_json(silent=True) or {})
+    try:
+        if form and data.get("scope") != "matching":
+            ids = [int(i) for i in data.getlist("ids")]
+        else:
+            ids = data.get("ids") if not form else None
+        if ids is not None:
+            if not isinstance(ids, list) or len(ids) > MAX_BULK_RESOLVE:
+                raise ValueError(f"ids must be a list of at most {MAX_BULK_RESOLVE} alert ids")
+            clauses = [Alert.id.in_([int(i) for i in ids]), Alert.resolved.is_(False)]
+        elif any(data.get(k) for k in ("condition", "sensor", "from", "to")):
+            clauses = alert_filters(data, state="open")
+        else:
+            raise ValueError("give ids or at least one of condition, sensor, from, to")
+    except (TypeError, ValueError) as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+
+    resolved = db.session.execute(
+        db.update(Alert).where(*clauses).values(resolved=True).returning(Alert.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    alert_engine.forget(*resolved)
+    if form:
+        return redirect(url_for("admin", **{k: v for k, v in data.items() if k in ("state", "from", "to", "condition", "sensor") and v}))
+    return jsonify({"status":"ok","resolved":len(resolved)})
 
 @app.route("/admin/login", methods=["POST"])
 def admin_login():
@@ -319,9 +1911,19 @@ def resolve_alert(alert_id):
     if alert:
         alert.resolved = True
         db.session.commit()
+        alert_engine.forget(alert_id)
         return jsonify({"status":"ok"})
     return jsonify({"status":"error","message":"not found"}), 404
 
+@app.route("/admin/models", methods=["GET", "POST"])
+def admin_models():
+    """This worker's loaded model version, per-crop load times and reload history; POST checks for a new version now."""
+    if not session.get("admin_authenticated"):
+        return jsonify({"status":"error","message":"unauthorized"}), 401
+    if request.method == "POST":
+        model_registry.reload()
+    return jsonify(model_registry.status())
+
 # price route left as in your file (unchanged)
 @app.route("/price", methods=["GET","POST"])
 def price():
@@ -336,35 +1938,26 @@ def price():
     years_range = range(2018, current_year + 10)
     prediction_year = current_year
 
+    model_set = model_registry.current
+    crop_names = model_set.crop_names
     if request.method == "POST":
         try:
             crop_name = request.form["crop"]
             rainfall = float(request.form["rainfall"])
             prediction_year = int(request.form.get("year", current_year))
 
-            if crop_name not in models:
+            if crop_name not in model_set.models:
                 error_message = f"No model found for {crop_name}"
                 return render_template("price.html", crops=crop_names, error_message=error_message,
                                        years_range=years_range, current_year=current_year)
 
-            model = models[crop_name]
-            crop_thresholds = thresholds.get(crop_name)
-
-            # (Simplified rainfall logic kept from your code)
-            mean_rainfall = crop_thresholds['mean_rainfall'] if crop_thresholds else 0
-            std_rainfall = crop_thresholds['std_rainfall'] if crop_thresholds else 0
-            deficient_threshold = mean_rainfall - 0.75 * std_rainfall
-            excessive_threshold = mean_rainfall + 0.75 * std_rainfall
-
-            if rainfall > excessive_threshold:
-                rainfall_category = "Excessive"; category_value = 1
-            elif rainfall < deficient_threshold:
-                rainfall_category = "Deficient"; category_value = -1
-            else:
-                rainfall_category = "Normal"; category_value = 0
+            crop_thresholds = model_set.thresholds.get(crop_name)
+            display_thresholds = crop_thresholds
+            rainfall_category, _ = classify_rainfall(crop_thresholds, rainfall)
 
-            # Dummy prediction if model exists
-            base_prediction = np.random.uniform(100, 200)   # Replace with model.predict()
+            # annual figure = mean of the 12 monthly forecasts, adjusted like the forecast API's
+            values, _ = forecast_years(crop_name, [prediction_year], model_set, rainfall=rainfall)[prediction_year]
+            base_prediction = float(values.mean())
             price_per_quintal = base_prediction * 25
             inflation_adjusted_price = price_per_quintal * 1.11
             confidence_range = price_per_quintal * 0.15
@@ -393,12 +1986,136 @@ def price():
                            years_range=years_range,
                            current_year=current_year)
 
+@app.route("/api/price/forecast")
+def price_forecast():
+    """
+    Monthly forecast for ?crop=&from=&to= and either ?scenario=normal|excessive|deficient
+    or ?rainfall=<mm>. Scenario queries read the precomputed scenario table; rainfall
+    queries interpolate the forecast cube. Anything outside the precomputed years or
+    rainfall range falls back to live model inference, adjusted like the tables, up to
+    MAX_FORECAST_YEARS either side of the precomputed years.
+    """
+    model_set = model_registry.current
+    crop_name = request.args.get("crop", "")
+    if crop_name not in model_set.models:
+        return jsonify({"status":"error","message":f"No model found for {crop_name}"}), 404
+    current_year = pd.Timestamp.now().year
+    try:
+        year_from = int(request.args.get("from", current_year))
+        year_to = int(request.args.get("to", year_from))
+        rainfall = request.args.get("rainfall")
+        rainfall = float(rainfall) if rainfall is not None else None
+    except ValueError:
+        return jsonify({"status":"error","message":"bad values"}), 400
+    if rainfall is not None and not math.isfinite(rainfall):
+        return jsonify({"status":"error","message":"bad values"}), 400
+    if year_to < year_from or year_to - year_from >= MAX_FORECAST_YEARS:
+        return jsonify({"status":"error","message":"bad year range"}), 400
+
+    crop_thresholds = model_set.thresholds.get(crop_name)
+    if rainfall is not None:
+        scenario = classify_rainfall(crop_thresholds, rainfall)[0].lower()
+    else:
+        scenario = request.args.get("scenario", "normal").lower()
+        if scenario not in FORECAST_SCENARIOS:
+            return jsonify({"status":"error","message":"unknown scenario"}), 400
+
+    years = list(range(year_from, year_to + 1))
+    try:
+        rows = forecast_years(crop_name, years, model_set, scenario, rainfall)
+    except ValueError as e:
+        return jsonify({"status":"error","message":str(e)}), 400
+
+    forecast = []
+    for year in years:
+        values, source = rows[year]
+        for month, wpi in enumerate(values.tolist(), start=1):
+            forecast.append({"year": year, "month": month, "wpi": round(wpi, 3),
+                             "per_quintal": round(wpi * 25, 2), "source": source})
+    return jsonify({"crop": crop_name, "scenario": scenario, "forecast": forecast})
+
+def recommendation_payload(device):
+    latest = latest_reading(device)
+    crop = recommend_crop(latest.get("temperature",0), latest.get("humidity",0), latest.get("soil",0), latest.get("soil_status","Unknown"))
+    # merge latest reading fields with crop suggestion
+    return {**latest, **crop}
+
 @app.route("/recommend")
 def recommend():
-    crop = recommend_crop(latest_data.get("temperature",0), latest_data.get("humidity",0), latest_data.get("soil",0), latest_data.get("soil_status","Unknown"))
-    # merge latest_data fields with crop suggestion
-    resp = {**latest_data, **crop}
-    return jsonify(resp)
+    device = request_device()
+    return response_cache.respond("recommend", device, lambda: recommendation_payload(device))
+
+MAX_RECOMMEND_BATCH = 10000
+
+@app.route("/api/recommend/batch", methods=["POST"])
+def recommend_batch():
+    """
+    Recommendations for many readings at once: {"readings": [...]} (same fields as /sensor)
+    or {"devices": [...]} for the latest reading of each device. Results keep the input order.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("readings", data.get("devices")), list):
+        return jsonify({"status":"error","message":"expected {\"readings\": [...]} or {\"devices\": [...]}"}), 400
+    items = data.get("readings", data.get("devices"))
+    if len(items) > MAX_RECOMMEND_BATCH:
+        return jsonify({"status":"error","message":f"batch larger than {MAX_RECOMMEND_BATCH}"}), 413
+
+    if "readings" in data:
+        now_utc = datetime.utcnow()
+        readings = []
+        for i, item in enumerate(items):
+            try:
+                readings.append(parse_reading(item, now_utc))
+            except ValueError as e:
+                return jsonify({"status":"error","message":f"reading {i}: {e}"}), 400
+    else:
+        readings = [latest_reading(str(device)[:64]) for device in items]
+    crops = crop_rules.match([r["temperature"] for r in readings], [r["humidity"] for r in readings],
+                             [r["soil"] for r in readings], [r["soil_status"] for r in readings]) if readings else []
+    # splice the prebuilt JSON instead of re-serializing the same few payloads per reading
+    body = '{"status":"ok","results":[' + ",".join(crop_rules.payload_json[c] for c in crops) + "]}"
+    return Response(body, mimetype="application/json")
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target (all workers, merged)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/events")
+def events():
+    """
+    SSE stream of 'reading', 'recommendation' and 'alert' events for ?device= (default:
+    the most recent reporter, like the dashboard's other panels), or ?device=* for all.
+    At most SSE_MAX_SUBSCRIBERS streams per worker; beyond that it answers 503 and the
+    dashboard falls back to polling.
+    """
+    device = request_device_or_fleet()
+    live_relay.start()
+    q = broadcaster.subscribe(device)
+    if q is None:
+        metrics.inc("sse_rejected_total")
+        return jsonify({"status":"error","message":"too many live connections, poll instead"}), 503, {"Retry-After": "60"}
+    snapshot = recommendation_payload(device or live_state.latest_device() or DEFAULT_DEVICE)
+
+    def stream():
+        try:
+            yield b"retry: 5000\n\n"
+            # snapshot first so a (re)connecting dashboard is current immediately
+            yield EventBroadcaster.format("recommendation", snapshot)
+            while True:
+                try:
+                    payload = q.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+                    continue
+                if payload is None:
+                    return
+                yield payload
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Run
 if __name__ == "__main__":
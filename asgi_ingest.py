@@ -0,0 +1,264 @@
+# asgi_ingest.py
+"""
+Asyncio ingestion server for ESP32 readings: an optional ASGI entry point next to the
+Flask app, for fleets larger than gunicorn's worker x thread count.
+
+    pip install uvicorn
+    uvicorn asgi_ingest:app --host 0.0.0.0 --port 8001
+
+POST /sensor and /sensor/batch take the same payloads and API key as the Flask routes
+and are validated by the same code (app.parse_reading / app.parse_batch). A request only
+parses and queues its readings; a single writer task drains the queue in micro-batches
+(whatever arrived within INGEST_FLUSH_INTERVAL seconds of the first reading, up to
+INGEST_FLUSH_MAX) and stores each batch with one app.ingest_readings() call on its own
+thread. The database sees one writer and one commit per batch however many devices are
+connected; alerts, rollups and live state are updated exactly as on the Flask path.
+
+With INGEST_ACK=commit (default) a response waits for the commit of its batch, so "ok"
+still means stored. INGEST_ACK=queued answers 202 once the reading is queued (anything
+still queued is lost if the process dies). A full queue answers 503 so the device keeps
+the reading in its own buffer and retries.
+
+If a micro-batch fails to commit, its requests are stored one by one so one bad request
+or a brief database lock does not fail the others; each failing request is retried with
+backoff (INGEST_RETRIES times). After that a waiting request gets a 500 (the device
+keeps its readings), and readings already acknowledged with 202 are appended to
+INGEST_DEAD_LETTER (JSON lines) instead of being dropped.
+
+Dashboards, /events and admin stay on the Flask app: route /sensor* to this server in
+the proxy. Run a single process; one writer per database is the point.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import app as webapp
+
+FLUSH_INTERVAL = float(os.environ.get("INGEST_FLUSH_INTERVAL", 0.05))
+FLUSH_MAX = int(os.environ.get("INGEST_FLUSH_MAX", 2000))
+QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 10000))  # queued requests before answering 503
+ACK = os.environ.get("INGEST_ACK", "commit")
+RETRIES = int(os.environ.get("INGEST_RETRIES", 5))  # per request, after its batch failed
+RETRY_DELAY = 0.1                                    # seconds, doubled on each retry
+DEAD_LETTER = os.environ.get("INGEST_DEAD_LETTER", os.path.join(webapp.DB_DIR, "ingest_failed.jsonl"))
+MAX_BODY_BYTES = 1024 * 1024
+
+webapp.metrics.describe("ingest_batches_total", "counter", "Micro-batches committed by the asyncio ingest writer.")
+webapp.metrics.describe("ingest_dead_letter_total", "counter", "Acknowledged readings written to the dead-letter file.")
+
+class IngestWriter:
+    """The request queue and the single task that writes it to the database."""
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_max=FLUSH_MAX, queue_size=QUEUE_SIZE, ack=ACK,
+                 retries=RETRIES, retry_delay=RETRY_DELAY, dead_letter=DEAD_LETTER):
+        self.flush_interval = flush_interval
+        self.flush_max = flush_max
+        self.queue_size = queue_size
+        self.ack = ack
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.dead_letter = dead_letter
+        self.queue = None  # created on the server's event loop by start()
+        self._task = None
+        self._pending = []     # taken off the queue, not yet handed to a flush
+        self._flushing = None  # the flush in progress, which stop() lets finish
+        # ingest_readings is blocking SQLAlchemy code; one thread keeps it off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self.batches = 0
+        self.readings = 0
+
+    def start(self):
+        if self._task is None:
+            self.queue = asyncio.Queue(self.queue_size)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            webapp.alert_dispatcher.start()
+            webapp.metrics.start()
+
+    async def stop(self):
+        """Stop taking batches and store everything already accepted, resolving every request's future."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._flushing is not None:
+            await self._flushing
+        items, self._pending = self._pending, []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        if items:
+            await self._flush(items)
+
+    def submit(self, parsed):
+        """Queue validated readings; the returned future resolves once they are committed. Raises asyncio.QueueFull."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((parsed, future))
+        return future
+
+    async def _run(self):
+        # stop() cancels this task; anything it has taken off the queue stays in
+        # self._pending, and a flush already started is shielded and awaited by stop()
+        while True:
+            self._pending.append(await self.queue.get())
+            # let the batch fill; requests keep arriving while the previous batch commits too
+            await asyncio.sleep(self.flush_interval)
+            count = len(self._pending[0][0])
+            while count < self.flush_max and not self.queue.empty():
+                item = self.queue.get_nowait()
+                self._pending.append(item)
+                count += len(item[0])
+            items, self._pending = self._pending, []
+            self._flushing = asyncio.ensure_future(self._flush(items))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, items):
+        parsed = [p for readings, _ in items for p in readings]
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._store, parsed)
+        except Exception as e:
+            print(f"⚠️ Ingest batch of {len(items)} requests failed, storing them one by one:", e)
+            for readings, future in items:
+                await self._flush_one(readings, future)
+            return
+        self.batches += 1
+        self.readings += len(parsed)
+        for _, future in items:
+            if not future.done():
+                future.set_result(None)
+
+    async def _flush_one(self, readings, future):
+        """Store one request's readings on its own, retrying with backoff before giving up."""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._store, readings)
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+                continue
+            self.batches += 1
+            self.readings += len(readings)
+            if not future.done():
+                future.set_result(None)
+            return
+        print("❌ Ingest request failed after retries:", error)
+        if self.ack == "queued":
+            # the device was already told 202 and will not resend: keep the readings
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._dead_letter, readings)
+        if not future.done():
+            future.set_exception(error)
+
+    def _dead_letter(self, readings):
+        with open(self.dead_letter, "a") as f:
+            for reading in readings:
+                f.write(json.dumps({**reading, "timestamp": reading["timestamp"].isoformat()}) + "\n")
+        webapp.metrics.inc("ingest_dead_letter_total", len(readings))
+
+    @staticmethod
+    def _store(parsed):
+        # the app context's teardown removes (and on error rolls back) the session
+        with webapp.app.app_context():
+            webapp.ingest_readings(parsed)
+        webapp.metrics.inc("ingest_batches_total")
+
+writer = IngestWriter()
+
+async def respond(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            writer.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await writer.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    writer.start()  # servers without lifespan support
+    path = scope["path"]
+    if path == "/health":
+        return await respond(send, 200, {"status": "ok", "queued": writer.queue.qsize(),
+                                         "batches": writer.batches, "readings": writer.readings})
+    if path not in ("/sensor", "/sensor/batch"):
+        return await respond(send, 404, {"status":"error","message":"not found"})
+    if scope["method"] != "POST":
+        return await respond(send, 405, {"status":"error","message":"method not allowed"})
+    headers = dict(scope["headers"])
+    if not webapp.api_key_valid(headers.get(b"x-api-key", b"").decode("latin-1")):
+        return await respond(send, 401, {"status":"error","message":"unauthorized"})
+
+    body = await read_body(receive)
+    if body is None:
+        return await respond(send, 413, {"status":"error","message":"body too large"})
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    now_utc = datetime.utcnow()
+    errors = []
+    if path == "/sensor":
+        if not data:
+            return await respond(send, 400, {"status":"error","message":"invalid json"})
+        try:
+            parsed = [webapp.parse_reading(data, now_utc)]
+        except ValueError as e:
+            return await respond(send, 400, {"status":"error","message":str(e)})
+    else:
+        try:
+            items, batch_device = webapp.batch_items(data)
+        except ValueError as e:
+            return await respond(send, 400, {"status":"error","message":str(e)})
+        if len(items) > webapp.MAX_BATCH_SIZE:
+            return await respond(send, 413, {"status":"error","message":f"batch larger than {webapp.MAX_BATCH_SIZE}"})
+        parsed, errors = webapp.parse_batch(items, batch_device, now_utc)
+        if not parsed:
+            return await respond(send, 400, {"status":"error","message":"no valid readings","accepted":0,"errors":errors})
+
+    try:
+        stored = writer.submit(parsed)
+    except asyncio.QueueFull:
+        return await respond(send, 503, {"status":"error","message":"busy, retry later"}, [(b"retry-after", b"1")])
+    if ACK == "queued":
+        # nobody awaits the commit; mark a failure as seen (the writer has already logged it)
+        stored.add_done_callback(lambda f: f.exception())
+        return await respond(send, 202, {"status":"queued","accepted":len(parsed),"errors":errors})
+    try:
+        await stored
+    except Exception:
+        return await respond(send, 500, {"status":"error","message":"could not store readings"})
+    if path == "/sensor":
+        return await respond(send, 200, {"status":"ok"})
+    return await respond(send, 200, {"status": "partial" if errors else "ok", "accepted": len(parsed), "errors": errors})
@@ -0,0 +1,41 @@
+# background.py
+"""
+Per-process background threads for the web app (alert delivery, model reloads,
+the live relay, metrics snapshots).
+
+Threads do not survive a fork: a gunicorn worker forked from a master that
+imported the app inherits the objects but not their threads. BackgroundThread
+remembers which process started it, so start() can be called on every request
+and starts a fresh thread the first time it runs in each process.
+"""
+import os
+import threading
+
+class BackgroundThread:
+    """A daemon thread running target(), started at most once per process."""
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        # a lock held by another thread at fork time would stay held in the child
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+
+    def running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def start(self):
+        """Start the thread unless it is already running in this process; True if this call started it."""
+        if self.running():
+            return False
+        with self._lock:
+            if self.running():
+                return False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+            return True
@@ -0,0 +1,229 @@
+# backtest.py
+"""
+Rolling-origin backtest of the crop price models.
+
+For each crop the distinct (Year, Month) periods are ordered and cut into
+`folds` origins: fold k trains on every period before its origin and is scored
+on the next `horizon` periods, the last fold ending at the newest period.
+The rainfall thresholds and deviation are recomputed from each fold's training
+rows only, so no test-period statistics leak into the features.
+
+Fold matrices are written to models/backtest/cache/ keyed by a hash of the
+crop's rows and the split settings, so re-running with the same data only pays
+for the fits. Crops x folds are fitted across a process pool; results go to
+models/backtest/backtest-<timestamp>.json (and latest.json) with MAPE and RMSE
+per fold and per crop, plus PNG plots with --plots.
+
+    python backtest.py --folds 4 --horizon 3 --plots models/backtest
+    python train.py --max-mape 0.15    # gate publishing a new version on it
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_percentage_error, mean_squared_error
+
+import data_store
+from train import MODEL_PARAMS
+
+BACKTEST_DIR = os.path.join("models", "backtest")
+FOLDS = 4
+HORIZON = 3        # periods (distinct Year/Month) scored per fold
+MIN_TRAIN = 12     # fewest training periods a fold may have
+# bump when the fold feature definition changes, to invalidate cached matrices
+FEATURE_VERSION = 1
+RAW_COLUMNS = data_store.RAW_COLUMNS
+
+def load_raw(data_path):
+    """{crop: DataFrame[Month, Year, Rainfall, WPI]} from a data store directory or a CSV."""
+    if os.path.isdir(data_path):
+        return {crop: data_store.load_crop(crop, RAW_COLUMNS, data_path) for crop in data_store.store_crops(data_path)}
+    df = data_store.normalize_columns(pd.read_csv(data_path))
+    if "Crop" not in df.columns:
+        raise ValueError(f"{data_path} has no Crop column; build a store with `python data_store.py ingest "
+                         f"{data_path} --default-crop <crop>` and pass that with --data")
+    return {crop: group[RAW_COLUMNS].reset_index(drop=True) for crop, group in df.groupby("Crop")}
+
+def rolling_origin_splits(periods, folds=FOLDS, horizon=HORIZON, min_train=MIN_TRAIN):
+    """[(train_periods, test_periods)] over sorted unique periods; folds without min_train history are dropped."""
+    periods = np.unique(periods)
+    splits = []
+    for k in range(folds, 0, -1):
+        origin = len(periods) - k * horizon
+        if origin < min_train:
+            continue
+        splits.append((periods[:origin], periods[origin:origin + horizon]))
+    return splits
+
+def fold_features(frame, train_rainfall):
+    """Model features as in train.train_crop_model, with the statistics taken from the training rows."""
+    mean, std = train_rainfall.mean(), train_rainfall.std()
+    rainfall = frame["Rainfall"].to_numpy(dtype=float)
+    category = np.where(rainfall > mean + 0.75 * std, 1, np.where(rainfall < mean - 0.75 * std, -1, 0))
+    return np.column_stack([frame["Month"], frame["Year"], rainfall, category, rainfall - mean]).astype(float)
+
+def _fingerprint(frame, params):
+    h = hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+def build_folds(crop, frame, params, cache_dir):
+    """Write (or reuse) one .npz per fold for this crop; returns [(fold, path, meta)]."""
+    frame = frame.dropna(subset=RAW_COLUMNS)
+    period = (frame["Year"] * 12 + frame["Month"] - 1).to_numpy()
+    key = _fingerprint(frame, {**params, "feature_version": FEATURE_VERSION})
+    out = []
+    for fold, (train_p, test_p) in enumerate(rolling_origin_splits(period, params["folds"], params["horizon"], params["min_train"])):
+        path = os.path.join(cache_dir, f"{data_store._safe_name(crop)}-{key}-{fold}.npz")
+        meta = {"fold": fold,
+                "train_end": f"{train_p[-1] // 12}-{train_p[-1] % 12 + 1:02d}",
+                "test_start": f"{test_p[0] // 12}-{test_p[0] % 12 + 1:02d}",
+                "test_end": f"{test_p[-1] // 12}-{test_p[-1] % 12 + 1:02d}"}
+        if not os.path.exists(path):
+            train, test = frame[np.isin(period, train_p)], frame[np.isin(period, test_p)]
+            arrays = {"X_train": fold_features(train, train["Rainfall"]), "y_train": train["WPI"].to_numpy(float),
+                      "X_test": fold_features(test, train["Rainfall"]), "y_test": test["WPI"].to_numpy(float)}
+            np.savez(path + ".tmp.npz", **arrays)
+            os.replace(path + ".tmp.npz", path)
+        out.append((fold, path, meta))
+    return out
+
+def _score_fold(crop, fold, path, meta, n_jobs):
+    """Process-pool entry point: fit one fold and score it on its test periods."""
+    start = time.perf_counter()
+    with np.load(path) as f:
+        X_train, y_train, X_test, y_test = f["X_train"], f["y_train"], f["X_test"], f["y_test"]
+    model = RandomForestRegressor(**MODEL_PARAMS, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    predicted = model.predict(X_test)
+    return crop, {**meta,
+                  "n_train": len(y_train), "n_test": len(y_test),
+                  "mape": float(mean_absolute_percentage_error(y_test, predicted)),
+                  "rmse": float(np.sqrt(mean_squared_error(y_test, predicted))),
+                  "seconds": round(time.perf_counter() - start, 3)}
+
+def run_backtest(data_path, folds=FOLDS, horizon=HORIZON, min_train=MIN_TRAIN, workers=None,
+                 out_dir=BACKTEST_DIR, plots=None, crops=None):
+    """Backtest every crop in data_path; returns (and writes) the results dict."""
+    params = {"folds": folds, "horizon": horizon, "min_train": min_train}
+    cache_dir = os.path.join(out_dir, "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    raw = load_raw(data_path)
+    if crops is not None:
+        raw = {crop: frame for crop, frame in raw.items() if crop in crops}
+
+    start = time.perf_counter()
+    tasks = [(crop, *fold) for crop, frame in sorted(raw.items()) for fold in build_folds(crop, frame, params, cache_dir)]
+    workers = workers or max(1, min(len(tasks), os.cpu_count() or 1))
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Backtesting {len(raw)} crops, {len(tasks)} folds on {workers} processes...")
+
+    fold_results = {crop: [] for crop in raw}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_score_fold, crop, fold, path, meta, n_jobs) for crop, fold, path, meta in tasks]
+            for future in as_completed(futures):
+                crop, result = future.result()
+                fold_results[crop].append(result)
+
+    summary = {}
+    for crop, rows in sorted(fold_results.items()):
+        rows.sort(key=lambda r: r["fold"])
+        if not rows:
+            summary[crop] = {"folds": [], "skipped": "not enough periods for a fold"}
+            print(f"  {crop}: skipped (not enough history)")
+            continue
+        summary[crop] = {"folds": rows,
+                         "mape": float(np.mean([r["mape"] for r in rows])),
+                         "rmse": float(np.mean([r["rmse"] for r in rows]))}
+        print(f"  {crop}: MAPE {summary[crop]['mape']:.2%}  RMSE {summary[crop]['rmse']:.2f}  ({len(rows)} folds)")
+
+    results = {"created_at": datetime.now().isoformat(timespec="seconds"), "data_path": data_path,
+               "params": params, "model": MODEL_PARAMS, "seconds": round(time.perf_counter() - start, 1),
+               "crops": summary}
+    path = os.path.join(out_dir, f"backtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    for target in (path, os.path.join(out_dir, "latest.json")):
+        with open(target + ".tmp", "w") as f:
+            json.dump(results, f, indent=2)
+        os.replace(target + ".tmp", target)
+    print(f"Backtest results written to {path}")
+    if plots:
+        save_plots(results, plots)
+    return results
+
+def failing_crops(results, max_mape):
+    """Crops whose mean backtest MAPE exceeds max_mape (a fraction, e.g. 0.15)."""
+    return sorted(crop for crop, r in results["crops"].items() if "mape" in r and r["mape"] > max_mape)
+
+def save_plots(results, out_dir):
+    """accuracy_line.png / accuracy_scatter.png (as train1.py drew them) and per-fold MAPE, without a display."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    scored = {crop: r for crop, r in sorted(results["crops"].items()) if "mape" in r}
+    if not scored:
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    crops = list(scored)
+    accuracies = [100 - 100 * r["mape"] for r in scored.values()]
+
+    for name, draw in (("accuracy_line.png", lambda: plt.plot(crops, accuracies, marker='o', color='blue', label="Backtest accuracy")),
+                       ("accuracy_scatter.png", lambda: plt.scatter(crops, accuracies, color='red', s=100, label="Backtest accuracy"))):
+        plt.figure(figsize=(10, 5))
+        draw()
+        plt.xlabel("Crop")
+        plt.ylabel("Accuracy (100 - MAPE %)")
+        plt.title("Crop Price Prediction Backtest Accuracy")
+        plt.xticks(rotation=45)
+        plt.ylim(min(accuracies) - 5, 100)
+        plt.grid(True)
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, name))
+        plt.close()
+
+    plt.figure(figsize=(10, 5))
+    for crop, r in scored.items():
+        plt.plot([f["test_start"] for f in r["folds"]], [100 * f["mape"] for f in r["folds"]], marker='o', label=crop)
+    plt.xlabel("Test window start")
+    plt.ylabel("MAPE (%)")
+    plt.title("Backtest MAPE per fold")
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(os.path.join(out_dir, "backtest_folds.png"))
+    plt.close()
+    print(f"Backtest plots saved to {out_dir}")
+
+def main(argv=None, **defaults):
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the crop price models.")
+    parser.add_argument('--data', default=None,
+                        help=f"CSV or data store directory (default: {data_store.STORE_DIR} if built, else merged.csv)")
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--horizon', type=int, default=HORIZON, help="periods scored per fold")
+    parser.add_argument('--min-train', type=int, default=MIN_TRAIN, help="fewest training periods per fold")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: one per fold, capped at the core count)")
+    parser.add_argument('--crop', action='append', dest='crops', default=None, help="only this crop (repeatable)")
+    parser.add_argument('--out', default=BACKTEST_DIR, help=f"results and cache directory (default: {BACKTEST_DIR})")
+    parser.add_argument('--plots', default=None, help="save PNG plots to this directory")
+    parser.add_argument('--max-mape', type=float, default=None, help="exit with status 1 if a crop's MAPE exceeds this")
+    parser.set_defaults(**defaults)
+    args = parser.parse_args(argv)
+    data = args.data or (data_store.STORE_DIR if data_store.has_store() else 'merged.csv')
+    results = run_backtest(data, args.folds, args.horizon, args.min_train, args.workers, args.out, args.plots, args.crops)
+    if args.max_mape is not None:
+        failing = failing_crops(results, args.max_mape)
+        if failing:
+            print(f"MAPE above {args.max_mape:.2%}: {', '.join(failing)}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_utils.py
+"""Helpers shared by the benchmark scripts (run them as `python benchmarks/<name>.py`)."""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))]
+
+def summarize(samples_ms, seconds=None):
+    """count, p50/p95/p99 (ms) and, given the wall time, throughput per second."""
+    s = sorted(samples_ms)
+    out = {"count": len(s)}
+    for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        value = percentile(s, q)
+        out[name] = round(value, 3) if value is not None else None
+    if seconds:
+        out["per_s"] = round(len(s) / seconds, 1)
+    return out
+
+def scratch_env(tmp_dir, **extra):
+    """Environment pointing the app at a throwaway database and live-state file in tmp_dir."""
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    env["LIVE_STATE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'live_state.db')}"
+    env.setdefault("ALERT_TRANSPORT", "stub")
+    env.update(extra)
+    return env
+
+def sqlite_size(path):
+    """Bytes of used pages in a SQLite database, including changes still in its WAL."""
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path)
+    try:
+        pages, free, page_size = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                                  for p in ("page_count", "freelist_count", "page_size"))
+    finally:
+        conn.close()
+    return (pages - free) * page_size
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path, results):
+    results = {"commit": git_commit(), "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "python": sys.version.split()[0], **results}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def wait_for_http(host, port, path="/", timeout=60):
+    import http.client
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
@@ -0,0 +1,142 @@
+# benchmarks/ingest_bench.py
+"""
+/sensor ingestion: the Flask app under gunicorn vs the asyncio server (asgi_ingest.py).
+
+Starts each server on its own scratch database and runs --devices concurrent devices,
+each on its own keep-alive connection, posting one reading per request and waiting
+--think seconds between posts (0 = as fast as the server answers). Reports accepted
+readings/s, latency percentiles, status codes and the rows that actually reached the
+database (and, for asgi, how many micro-batch commits carried them).
+
+    python benchmarks/ingest_bench.py --devices 50 200 --duration 15
+    python benchmarks/ingest_bench.py --modes asgi --ack queued
+
+The asgi mode needs uvicorn (pip install uvicorn).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_utils import ROOT, git_commit, scratch_env, summarize, wait_for_http, write_results
+from load_test import HttpClient, Recorder, count_rows
+
+def device_worker(client, device, args, stop, rec):
+    headers = {"X-API-KEY": args.api_key, "Content-Type": "application/json"}
+    while not stop.is_set():
+        body = json.dumps({"device": device, "temperature": round(random.gauss(27, 4), 1),
+                           "humidity": round(random.uniform(30, 90)), "soil_analog": random.randint(10, 90),
+                           "soil_digital": random.choice(["Wet", "Dry"])})
+        started = time.perf_counter()
+        try:
+            status, _, _ = client.request("POST", "/sensor", body, headers)
+            rec.record("sensor", started, status)
+            if status in (200, 202):
+                rec.readings += 1
+        except Exception as e:
+            rec.error("sensor", e)
+        if args.think:
+            stop.wait(args.think)
+
+def run_devices(host, port, devices, args):
+    stop = threading.Event()
+    recorders = [Recorder() for _ in range(devices)]
+    threads = [threading.Thread(target=device_worker, args=(HttpClient(host, port), f"bench-{i:04d}", args, stop, rec),
+                                daemon=True) for i, rec in enumerate(recorders)]
+    for t in threads:
+        t.start()
+    time.sleep(args.warmup)
+    for rec in recorders:
+        rec.__init__()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=35)
+    elapsed = time.perf_counter() - started
+
+    samples, statuses, errors = [], {}, {}
+    for rec in recorders:
+        samples += rec.samples.get("sensor", [])
+        for status, n in rec.statuses.get("sensor", {}).items():
+            statuses[str(status)] = statuses.get(str(status), 0) + n
+        for err, n in rec.errors.get("sensor", {}).items():
+            errors[err] = errors.get(err, 0) + n
+    readings = sum(rec.readings for rec in recorders)
+    return {"devices": devices, "seconds": round(elapsed, 2), "readings_per_s": round(readings / elapsed, 1),
+            "latency": summarize(samples, elapsed), "statuses": statuses, "errors": errors}
+
+def start_server(mode, port, env, args):
+    if mode == "flask":
+        cmd = ["gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "app:app"]
+        env = {**env, "WEB_CONCURRENCY": str(args.workers)}
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi_ingest:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning", "--no-access-log", "--backlog", "4096"]
+        env = {**env, "INGEST_ACK": args.ack, "INGEST_FLUSH_INTERVAL": str(args.flush_interval)}
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def health(host, port):
+    client = HttpClient(host, port)
+    status, _, body = client.request("GET", "/health")
+    return json.loads(body) if status == 200 else {}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=("flask", "asgi"), default=["flask", "asgi"])
+    parser.add_argument("--devices", type=int, nargs="+", default=[50, 200], help="concurrent devices (one run each)")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds a device waits between posts")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the flask mode")
+    parser.add_argument("--ack", choices=("commit", "queued"), default="commit", help="INGEST_ACK for the asgi mode")
+    parser.add_argument("--flush-interval", type=float, default=0.05, help="INGEST_FLUSH_INTERVAL for the asgi mode")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--api-key", default="your api key", help="must match SENSOR_API_KEY")
+    parser.add_argument("--out", default=None, help="results JSON path")
+    args = parser.parse_args()
+
+    if "asgi" in args.modes and importlib.util.find_spec("uvicorn") is None:
+        print("uvicorn is not installed; skipping the asgi mode (pip install uvicorn)")
+        args.modes = [m for m in args.modes if m != "asgi"]
+
+    results = {"config": {k: v for k, v in vars(args).items() if k != "out"}, "runs": []}
+    for mode in args.modes:
+        for devices in args.devices:
+            tmp_dir = tempfile.mkdtemp(prefix="ingest_bench_")
+            db_path = os.path.join(tmp_dir, "bench.db")
+            port = 5900 + random.randrange(300)
+            server = start_server(mode, port, scratch_env(tmp_dir), args)
+            try:
+                if not wait_for_http("127.0.0.1", port, "/health" if mode == "asgi" else "/latest-sensor"):
+                    raise SystemExit(f"{mode} server did not come up")
+                run = {"mode": mode, **run_devices("127.0.0.1", port, devices, args)}
+                if mode == "asgi":
+                    time.sleep(args.flush_interval * 4)  # let queued readings land before counting
+                    stats = health("127.0.0.1", port)
+                    run["batches"] = stats.get("batches")
+                    run["readings_per_batch"] = round(stats["readings"] / stats["batches"], 1) if stats.get("batches") else None
+                run["rows_in_db"] = count_rows(db_path)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            results["runs"].append(run)
+            lat = run["latency"]
+            print(f"{mode:5s} devices={devices:4d}  {run['readings_per_s']:8.1f} readings/s  p50={lat['p50_ms']}  "
+                  f"p95={lat['p95_ms']}  p99={lat['p99_ms']} ms  statuses={run['statuses']}"
+                  + (f"  errors={run['errors']}" if run["errors"] else "")
+                  + (f"  {run['readings_per_batch']} readings/commit" if run.get("readings_per_batch") else ""))
+
+    out = write_results(args.out or os.path.join(ROOT, "benchmarks", "results", f"ingest_{git_commit() or 'local'}.json"),
+                        results)
+    print(f"results written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# benchmarks/load_test.py
+"""
+Load test: a synthetic ESP32 fleet posting readings while dashboards poll.
+
+Each simulated device posts on its own schedule (--rate readings/s, --batch readings
+per POST: 1 uses /sensor, more uses /sensor/batch like the firmware). Reader threads
+cycle through /history, /recommend and POST /price, sending If-None-Match like a
+browser. The app runs against a scratch database in one of three ways:
+
+  --mode inprocess   Flask test clients in threads (app code only, no HTTP server)
+  --mode gunicorn    gunicorn with gunicorn.conf.py on a local port (--workers)
+  --url URL          an already running server (DB size is only reported with --db)
+
+Results (throughput, p50/p95/p99 per endpoint, DB growth) are written as JSON,
+by default to benchmarks/results/load_<mode>_<commit>.json; --compare prints the
+change against an earlier result file.
+
+    python benchmarks/load_test.py --mode gunicorn --devices 50 --rate 1 --readers 20 --duration 30
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from bench_utils import ROOT, git_commit, scratch_env, sqlite_size, summarize, wait_for_http, write_results
+
+READER_REQUESTS = ("history", "recommend", "price")
+
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+# reconnect rather than reuse a connection idle this long (gunicorn's keepalive defaults to 2 s)
+IDLE_RECONNECT_SECONDS = 1.5
+
+class HttpClient:
+    """
+    Keep-alive HTTP/1.1 client with the request() signature the workers use.
+
+    A failed request is retried once on a new connection only if it never reached the
+    server (the send failed) or is a GET/HEAD; a POST that may have been stored is
+    reported as an error rather than sent twice.
+    """
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+        self.last_used = 0.0
+
+    def _close(self):
+        self.conn.close()
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in (1, 2):
+            if self.conn is not None and time.monotonic() - self.last_used > IDLE_RECONNECT_SECONDS:
+                self._close()
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+            except (OSError, http.client.HTTPException):
+                # nothing was processed: safe to retry any method
+                self._close()
+                if attempt == 2:
+                    raise
+                continue
+            try:
+                resp = self.conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException):
+                # the server may have acted on the request before the connection dropped
+                self._close()
+                if attempt == 2 or method not in IDEMPOTENT_METHODS:
+                    raise
+                continue
+            self.last_used = time.monotonic()
+            return resp.status, resp.getheader("ETag"), data
+
+class InProcessClient:
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        resp = self.client.open(path, method=method, data=body, headers=headers or {})
+        return resp.status_code, resp.headers.get("ETag"), resp.get_data()
+
+class Recorder:
+    """Per-thread latency samples, merged after the run (no locking on the hot path)."""
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+        self.errors = {}
+        self.readings = 0
+
+    def record(self, name, started, status):
+        self.samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        self.statuses.setdefault(name, {}).setdefault(status, 0)
+        self.statuses[name][status] += 1
+
+    def error(self, name, exc):
+        self.errors.setdefault(name, {}).setdefault(type(exc).__name__, 0)
+        self.errors[name][type(exc).__name__] += 1
+
+def device_worker(client, device, args, stop, rec):
+    interval = args.batch / args.rate
+    headers = {"X-API-KEY": args.api_key, "Content-Type": "application/json"}
+    next_at = time.perf_counter() + random.uniform(0, interval)  # spread the fleet out
+    while not stop.is_set():
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            stop.wait(delay)
+            if stop.is_set():
+                break
+        readings = [{"temperature": round(random.gauss(27, 4), 1), "humidity": round(random.uniform(30, 90)),
+                     "soil_analog": random.randint(10, 90), "soil_digital": random.choice(["Wet", "Dry"]),
+                     "heat_index": round(random.gauss(29, 4), 1),
+                     "age_ms": int((args.batch - 1 - i) * 1000 / args.rate)}
+                    for i in range(args.batch)]
+        if args.batch == 1:
+            path, body = "/sensor", {**readings[0], "device": device}
+        else:
+            path, body = "/sensor/batch", {"device": device, "readings": readings}
+        started = time.perf_counter()
+        try:
+            status, _, _ = client.request("POST", path, json.dumps(body), headers)
+            rec.record("sensor", started, status)
+            if status == 200:
+                rec.readings += args.batch
+        except Exception as e:
+            rec.error("sensor", e)
+        # open loop: a late device does not send a burst to catch up
+        next_at = max(next_at + interval, time.perf_counter() - interval)
+
+def reader_worker(client, devices, crops, args, stop, rec):
+    etags = {}
+    device = random.choice(devices)
+    step = random.randrange(len(READER_REQUESTS))
+    while not stop.is_set():
+        name = READER_REQUESTS[step % len(READER_REQUESTS)]
+        step += 1
+        if name == "price":
+            method, path, headers = "POST", "/price", {"Content-Type": "application/x-www-form-urlencoded"}
+            body = urlencode({"crop": random.choice(crops), "rainfall": round(random.uniform(100, 2500), 1),
+                              "year": random.randint(2018, 2030)})
+        else:
+            method, path, body = "GET", f"/{name}?device={device}", None
+            headers = {"If-None-Match": etags[path]} if path in etags and not args.no_etag else {}
+        started = time.perf_counter()
+        try:
+            status, etag, _ = client.request(method, path, body, headers)
+            rec.record(name, started, status)
+            if etag:
+                etags[path] = etag
+        except Exception as e:
+            rec.error(name, e)
+        if args.reader_interval:
+            stop.wait(args.reader_interval)
+
+def run_load(make_client, args, crops):
+    devices = [f"bench-{i:04d}" for i in range(args.devices)]
+    stop = threading.Event()
+    threads, recorders = [], []
+    for device in devices:
+        rec = Recorder()
+        recorders.append(rec)
+        threads.append(threading.Thread(target=device_worker, args=(make_client(), device, args, stop, rec), daemon=True))
+    for _ in range(args.readers):
+        rec = Recorder()
+        recorders.append(rec)
+        threads.append(threading.Thread(target=reader_worker, args=(make_client(), devices, crops, args, stop, rec),
+                                        daemon=True))
+    for t in threads:
+        t.start()
+    if args.warmup:
+        time.sleep(args.warmup)
+        for rec in recorders:  # drop warmup samples, keep the threads' clients warm
+            rec.__init__()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=35)
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in ("sensor",) + READER_REQUESTS:
+        samples, statuses, errors = [], {}, {}
+        for rec in recorders:
+            samples += rec.samples.get(name, [])
+            for status, n in rec.statuses.get(name, {}).items():
+                statuses[str(status)] = statuses.get(str(status), 0) + n
+            for err, n in rec.errors.get(name, {}).items():
+                errors[err] = errors.get(err, 0) + n
+        if samples or errors:
+            endpoints[name] = {**summarize(samples, elapsed), "statuses": statuses, "errors": errors}
+    readings = sum(rec.readings for rec in recorders)
+    return {"seconds": round(elapsed, 2), "readings": readings, "readings_per_s": round(readings / elapsed, 1),
+            "endpoints": endpoints}
+
+def model_crops():
+    names = sorted(f[:-len("_forest.npz")] for f in os.listdir(os.path.join(ROOT, "models")) if f.endswith("_forest.npz"))
+    return names or ["Wheat"]
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sensor_reading").fetchone()[0]
+
+def compare(previous_path, results):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nvs {previous_path} (commit {previous.get('commit')}):")
+    for name, now in results["endpoints"].items():
+        before = previous.get("endpoints", {}).get(name)
+        if not before or not before.get("p95_ms") or not now.get("p95_ms"):
+            continue
+        print(f"  {name:10s} p95 {before['p95_ms']:8.2f} -> {now['p95_ms']:8.2f} ms ({now['p95_ms'] / before['p95_ms']:.2f}x)"
+              f"   per_s {before.get('per_s')} -> {now.get('per_s')}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn"), default="inprocess")
+    parser.add_argument("--url", default=None, help="target a running server instead of starting one")
+    parser.add_argument("--db", default=None, help="with --url: the server's SQLite file, for DB growth")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (WEB_CONCURRENCY)")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second per device")
+    parser.add_argument("--batch", type=int, default=1, help="readings per POST (1 = /sensor)")
+    parser.add_argument("--readers", type=int, default=10)
+    parser.add_argument("--reader-interval", type=float, default=0.5, help="seconds between a reader's requests")
+    parser.add_argument("--no-etag", action="store_true", help="readers do not send If-None-Match")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--api-key", default="your api key", help="must match SENSOR_API_KEY")
+    parser.add_argument("--out", default=None, help="results JSON path")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    mode = "url" if args.url else args.mode
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    crops = model_crops()
+    tmp_dir = tempfile.mkdtemp(prefix="load_test_") if mode != "url" else None
+    db_path = os.path.join(tmp_dir, "bench.db") if tmp_dir else args.db
+    server = None
+    try:
+        if mode == "inprocess":
+            os.environ.update(scratch_env(tmp_dir))
+            sys.path.insert(0, ROOT)
+            from app import app as flask_app
+            make_client = lambda: InProcessClient(flask_app)
+        else:
+            if mode == "gunicorn":
+                port = 5600 + random.randrange(300)
+                env = scratch_env(tmp_dir, WEB_CONCURRENCY=str(args.workers))
+                server = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "app:app"],
+                                          cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                host = "127.0.0.1"
+            else:
+                parts = urlsplit(args.url)
+                host, port = parts.hostname, parts.port or 80
+            if not wait_for_http(host, port, "/latest-sensor"):
+                raise SystemExit("server did not come up")
+            make_client = lambda: HttpClient(host, port)
+
+        rows_before = count_rows(db_path) if db_path and os.path.exists(db_path) else 0
+        size_before = sqlite_size(db_path) if db_path else None
+        results = run_load(make_client, args, crops)
+        if db_path and os.path.exists(db_path):
+            size_after = sqlite_size(db_path)
+            rows = count_rows(db_path) - rows_before
+            results["db"] = {"bytes_before": size_before, "bytes_after": size_after, "rows_added": rows,
+                             "bytes_per_reading": round((size_after - size_before) / rows, 1) if rows else None}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    results = {"mode": mode, "config": config, **results}
+    print(f"{mode}: {results['readings_per_s']} readings/s over {results['seconds']}s")
+    for name, stats in results["endpoints"].items():
+        print(f"  {name:10s} n={stats['count']:6d} {stats.get('per_s', 0):8.1f}/s  p50={stats['p50_ms']}  "
+              f"p95={stats['p95_ms']}  p99={stats['p99_ms']} ms  statuses={stats['statuses']}"
+              + (f"  errors={stats['errors']}" if stats["errors"] else ""))
+    if "db" in results:
+        print(f"  db: +{results['db']['rows_added']} rows, {results['db']['bytes_after'] - results['db']['bytes_before']} bytes"
+              f" ({results['db']['bytes_per_reading']} bytes/reading)")
+    out = write_results(args.out or os.path.join(ROOT, "benchmarks", "results",
+                                                  f"load_{mode}_{git_commit() or 'local'}.json"), results)
+    print(f"results written to {out}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/storage_bench.py
+"""
+Insert and range-query throughput of the sensor store at a realistic table size.
+
+Builds a throwaway SQLite database (default 10M readings from 4 devices, one
+reading every 3 s per device), then times:
+
+  bulk insert        Core executemany in pages of --batch rows (how the table was filled)
+  ingest             app.ingest_readings() with ESP32-sized batches of 10 on the full table
+  latest 200         /history fallback: newest 200 rows of one device
+  1h window          all rows of one device in a random hour
+  1d average         AVG over a random day, all devices
+  export page        one 5000-row keyset page of /download-history at a random position
+
+Run with --baseline to drop the indexes and SQLite PRAGMAs for comparison.
+
+    python benchmarks/storage_bench.py --rows 10000000 --json bench_storage.json
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bench_utils import ROOT, summarize, write_results
+
+DEVICES = ["esp32-a", "esp32-b", "esp32-c", "esp32-d"]
+SAMPLE_SECONDS = 3
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {**summarize(samples), "qps": round(1000 * len(samples) / sum(samples), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per bulk insert")
+    parser.add_argument("--queries", type=int, default=200, help="repetitions per query")
+    parser.add_argument("--db", default=None, help="database file (default: a temp file, deleted afterwards)")
+    parser.add_argument("--baseline", action="store_true", help="no indexes, default SQLite settings")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db is None:
+        tmp_dir = tempfile.mkdtemp(prefix="storage_bench_")
+        args.db = os.path.join(tmp_dir, "bench.db")
+    # point the app at the scratch database before importing it
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("LIVE_STATE_URL", "memory://")
+    os.environ.setdefault("ALERT_TRANSPORT", "stub")
+    sys.path.insert(0, ROOT)
+    import app as webapp
+    from app import app, db, SensorReading
+
+    results = {"rows": args.rows, "baseline": args.baseline, "database": args.db}
+    with app.app_context():
+        if args.baseline:
+            db.engine.dispose()
+            webapp.SQLITE_PRAGMAS.clear()
+            with db.engine.begin() as conn:
+                conn.execute(db.text("PRAGMA journal_mode=DELETE"))
+                for table in db.metadata.sorted_tables:
+                    for index in table.indexes:
+                        conn.execute(db.text(f"DROP INDEX IF EXISTS {index.name}"))
+
+        start = datetime.utcnow() - timedelta(seconds=args.rows * SAMPLE_SECONDS // len(DEVICES))
+        rng = np.random.default_rng(0)
+        t0 = time.perf_counter()
+        for offset in range(0, args.rows, args.batch):
+            n = min(args.batch, args.rows - offset)
+            i = np.arange(offset, offset + n)
+            seconds = (i // len(DEVICES)) * SAMPLE_SECONDS
+            temperature = rng.normal(27, 4, n).round(1)
+            humidity = rng.uniform(30, 90, n).round(0)
+            soil = rng.integers(10, 90, n)
+            rows = [
+                {"timestamp": start + timedelta(seconds=int(s)), "device": DEVICES[k % len(DEVICES)],
+                 "temperature": float(t), "humidity": float(h), "soil": int(m),
+                 "soil_status": "Wet" if m > 50 else "Dry"}
+                for k, s, t, h, m in zip(i, seconds, temperature, humidity, soil)
+            ]
+            db.session.execute(db.insert(SensorReading), rows)
+            db.session.commit()
+        elapsed = time.perf_counter() - t0
+        results["bulk_insert"] = {"seconds": round(elapsed, 1), "rows_per_s": round(args.rows / elapsed)}
+        print(f"bulk insert: {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+        end = start + timedelta(seconds=args.rows * SAMPLE_SECONDS // len(DEVICES))
+        span = (end - start).total_seconds()
+
+        def ingest():
+            now = datetime.utcnow()
+            webapp.ingest_readings([
+                {"temperature": 26.0, "humidity": 60.0, "soil": 55, "soil_status": "Wet", "heat_index": None,
+                 "timestamp": now - timedelta(seconds=SAMPLE_SECONDS * (9 - j)), "device": DEVICES[0]}
+                for j in range(10)
+            ])
+        ingest_stats = timed(ingest, args.queries)
+        ingest_stats["rows_per_s"] = round(ingest_stats["qps"] * 10)
+        results["ingest_batch_of_10"] = ingest_stats
+
+        def latest_200():
+            db.session.execute(
+                db.select(SensorReading).where(SensorReading.device == random.choice(DEVICES))
+                .order_by(SensorReading.timestamp.desc()).limit(200)).all()
+
+        def hour_window():
+            t = start + timedelta(seconds=random.uniform(0, span - 3600))
+            db.session.execute(
+                db.select(SensorReading).where(SensorReading.device == random.choice(DEVICES),
+                                               SensorReading.timestamp >= t,
+                                               SensorReading.timestamp < t + timedelta(hours=1))).all()
+
+        def day_average():
+            t = start + timedelta(seconds=random.uniform(0, span - 86400))
+            db.session.execute(
+                db.select(db.func.avg(SensorReading.temperature))
+                .where(SensorReading.timestamp >= t, SensorReading.timestamp < t + timedelta(days=1))).one()
+
+        def export_page():
+            t = start + timedelta(seconds=random.uniform(0, span))
+            db.session.execute(
+                db.select(SensorReading.id, SensorReading.timestamp, SensorReading.temperature)
+                .where(SensorReading.timestamp < t)
+                .order_by(SensorReading.timestamp.desc(), SensorReading.id.desc()).limit(5000)).all()
+
+        queries = {"latest_200": latest_200, "hour_window": hour_window,
+                   "day_average": day_average, "export_page": export_page}
+        # full scans are slow without indexes; fewer repetitions keep the baseline run bounded
+        repeat = max(5, args.queries // 20) if args.baseline else args.queries
+        for name, fn in queries.items():
+            results[name] = timed(fn, repeat)
+        db.session.remove()
+        db.engine.dispose()
+
+    for name, stats in results.items():
+        if isinstance(stats, dict):
+            print(f"{name:20s} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    if args.json_path:
+        write_results(args.json_path, results)
+    if tmp_dir is not None:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+if __name__ == "__main__":
+    main()
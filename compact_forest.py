@@ -0,0 +1,85 @@
+# compact_forest.py
+"""
+Flat NumPy representation of a fitted RandomForestRegressor.
+
+train.py exports every tree's nodes into five contiguous arrays (feature,
+threshold, left, right, value) saved as models/{crop}_forest.npz; the web app
+loads that file instead of unpickling the sklearn forest and predicts a whole
+batch by walking all trees at once.
+"""
+import numpy as np
+
+def flatten_forest(model):
+    """Concatenate the nodes of all trees; leaves point to themselves so traversal needs no branching."""
+    trees = [est.tree_ for est in model.estimators_]
+    counts = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        own = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+
+    feature_names = getattr(model, "feature_names_in_", None)
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": offsets.astype(np.int32),
+        "max_depth": np.int32(max(t.max_depth for t in trees)),
+        "feature_names": np.array(feature_names if feature_names is not None else [], dtype=str),
+    }
+
+def save_forest(arrays, path):
+    np.savez(path, **arrays)
+
+class CompactForest:
+    """Vectorized evaluator for flatten_forest() output; predict() matches RandomForestRegressor.predict."""
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        names = arrays["feature_names"]
+        if len(names):
+            self.feature_names_in_ = np.asarray(names, dtype=object)
+        self.n_estimators = len(self.roots)
+        # children[2*i] is the left and children[2*i + 1] the right child of node i
+        self.children = np.column_stack([self.left, self.right]).ravel()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def predict(self, X):
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(getattr(X, "values", X), dtype=np.float32).astype(np.float64)
+        n, k = X.shape
+        flat_X = X.ravel()
+        # one slot per (row, tree); base is the row's offset into flat_X
+        base = np.repeat(np.arange(n, dtype=np.int64) * k, self.n_estimators)
+        node = np.tile(self.roots, n)
+        for _ in range(self.max_depth):
+            go_right = ~(flat_X[base + self.feature[node]] <= self.threshold[node])
+            node = self.children[2 * node + go_right]
+        return self.value[node].reshape(n, self.n_estimators).mean(axis=1)
+
+def check_parity(model, forest, X, rtol=1e-9):
+    """Raise ValueError if the compact forest disagrees with the sklearn model on X."""
+    expected = model.predict(X)
+    got = forest.predict(X)
+    if not np.allclose(got, expected, rtol=rtol, atol=1e-9):
+        worst = float(np.max(np.abs(got - expected)))
+        raise ValueError(f"compact forest differs from sklearn (max abs diff {worst:.3g})")
+    return float(np.max(np.abs(got - expected))) if len(expected) else 0.0
@@ -0,0 +1,200 @@
+# data_store.py
+"""
+Columnar training-data store, one file per crop.
+
+`python data_store.py ingest merged.csv` reads the CSVs in chunks, normalizes the column names (Rainfall_x -> Rainfall, WPI_x/WPI_y -> WPI),
+splits rows by crop and writes data/store/<crop>.<ext> with the derived features
+computed once per crop (a single-crop CSV without a Crop column needs
+`--default-crop <crop>`):
+
+  Rainfall_Category   -1 / 0 / 1 outside mean -/+ 0.75 std (as in train.py)
+  Rainfall_Deviation  rainfall minus the crop's mean rainfall
+  Flood_Flag          1 above mean + 1.5 std (as in train1.py)
+
+Files are Parquet when pyarrow is installed (optional dependency), otherwise
+pickled DataFrames. train.py and train1.py read them through load_crop() /
+load_crops(), asking only for the columns they use.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join("data", "store")
+MANIFEST = "manifest.json"
+CHUNKSIZE = 200_000
+
+# source column -> store column; the first alias present wins
+COLUMN_ALIASES = {
+    "Rainfall": ["Rainfall", "Rainfall_x", "Rainfall_y"],
+    "WPI": ["WPI", "WPI_y", "WPI_x"],
+}
+DERIVED = ["Rainfall_Category", "Rainfall_Deviation", "Flood_Flag"]
+# what a crop's models are trained from; fingerprint() hashes these
+RAW_COLUMNS = ["Month", "Year", "Rainfall", "WPI"]
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "pickle"
+
+FORMATS = {
+    "parquet": (".parquet", lambda df, path: df.to_parquet(path, index=False),
+                lambda path, columns: pd.read_parquet(path, columns=columns)),
+    "feather": (".feather", lambda df, path: df.reset_index(drop=True).to_feather(path),
+                lambda path, columns: pd.read_feather(path, columns=columns)),
+    "pickle": (".pkl", lambda df, path: df.to_pickle(path),
+               lambda path, columns: pd.read_pickle(path) if columns is None else pd.read_pickle(path)[columns]),
+}
+
+def normalize_columns(df):
+    df = df.loc[:, ~df.columns.duplicated()]
+    renames = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        present = [a for a in aliases if a in df.columns]
+        if present and target not in df.columns:
+            renames[present[0]] = target
+    df = df.rename(columns=renames)
+    # stale derivations from upstream files are replaced by ours
+    return df.drop(columns=[c for c in DERIVED if c in df.columns])
+
+def derive_features(df):
+    """Per-crop derived columns; df holds one crop."""
+    rainfall = df["Rainfall"]
+    mean, std = rainfall.mean(), rainfall.std()
+    df["Rainfall_Category"] = np.select([rainfall > mean + 0.75 * std, rainfall < mean - 0.75 * std],
+                                        [1, -1], 0).astype(np.int64)
+    df["Rainfall_Deviation"] = rainfall - mean
+    df["Flood_Flag"] = (rainfall > mean + 1.5 * std).astype(np.int64)
+    return {"rows": len(df), "mean_rainfall": float(mean), "std_rainfall": float(std)}
+
+def fingerprint(df, rows=None):
+    """Content hash of the raw training columns (of the first `rows` rows), for change detection."""
+    frame = normalize_columns(df)
+    frame = frame[[c for c in RAW_COLUMNS if c in frame.columns]]
+    if rows is not None:
+        frame = frame.iloc[:rows]
+    hashed = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()[:16]
+
+def _safe_name(crop):
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(crop))
+
+def ingest(sources, store_dir=STORE_DIR, fmt=None, default_crop=None, chunksize=CHUNKSIZE):
+    """
+    Convert CSV sources into the per-crop store. A source without a 'Crop' column is
+    labelled default_crop; without one it raises ValueError rather than guess a crop.
+
+    Pass 1 streams each CSV in chunks and appends the rows to per-crop staging files;
+    pass 2 loads one crop at a time, derives the features and writes the final file,
+    so peak memory is one crop rather than the whole dataset.
+    """
+    fmt = fmt or default_format()
+    ext, write, read = FORMATS[fmt]
+    staging = os.path.join(store_dir, ".staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    parts = {}  # crop -> staging part count
+    sources_info = []
+    try:
+        for path in sources:
+            rows = 0
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                chunk = normalize_columns(chunk)
+                if "Crop" not in chunk.columns:
+                    if not default_crop:
+                        raise ValueError(f"{path} has no Crop column; name its crop with --default-crop")
+                    chunk["Crop"] = default_crop
+                for crop, group in chunk.groupby("Crop", sort=False):
+                    n = parts.get(crop, 0)
+                    group.to_pickle(os.path.join(staging, f"{_safe_name(crop)}.{n:05d}.pkl"))
+                    parts[crop] = n + 1
+                rows += len(chunk)
+            stat = os.stat(path)
+            sources_info.append({"path": path, "rows": rows, "bytes": stat.st_size, "mtime": stat.st_mtime})
+            print(f"read {rows} rows from {path}")
+
+        crops = {}
+        for crop, n in sorted(parts.items()):
+            df = pd.concat([pd.read_pickle(os.path.join(staging, f"{_safe_name(crop)}.{i:05d}.pkl"))
+                            for i in range(n)], ignore_index=True)
+            stats = derive_features(df)
+            target = os.path.join(store_dir, _safe_name(crop) + ext)
+            write(df, target + ".tmp")
+            os.replace(target + ".tmp", target)
+            crops[crop] = {"file": os.path.basename(target), "columns": list(df.columns),
+                           "fingerprint": fingerprint(df), **stats}
+            print(f"  {crop}: {stats['rows']} rows -> {target}")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # drop files of crops that are no longer in the sources
+    keep = {info["file"] for info in crops.values()}
+    for path in glob.glob(os.path.join(store_dir, "*" + ext)):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+    manifest = {"format": fmt, "created_at": datetime.now().isoformat(timespec="seconds"),
+                "sources": sources_info, "crops": crops}
+    with open(os.path.join(store_dir, MANIFEST + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(store_dir, MANIFEST + ".tmp"), os.path.join(store_dir, MANIFEST))
+    return manifest
+
+def read_manifest(store_dir=STORE_DIR):
+    with open(os.path.join(store_dir, MANIFEST)) as f:
+        return json.load(f)
+
+def has_store(store_dir=STORE_DIR):
+    return os.path.exists(os.path.join(store_dir, MANIFEST))
+
+def store_crops(store_dir=STORE_DIR):
+    return sorted(read_manifest(store_dir)["crops"])
+
+def load_crop(crop, columns=None, store_dir=STORE_DIR, manifest=None):
+    """One crop's rows; with `columns`, only those columns are read from disk (Parquet/Feather)."""
+    manifest = manifest or read_manifest(store_dir)
+    info = manifest["crops"][crop]
+    _, _, read = FORMATS[manifest["format"]]
+    return read(os.path.join(store_dir, info["file"]), list(columns) if columns is not None else None)
+
+def load_crops(crops=None, columns=None, store_dir=STORE_DIR):
+    """Several crops concatenated, with a Crop column."""
+    manifest = read_manifest(store_dir)
+    crops = sorted(manifest["crops"]) if crops is None else [c for c in crops if c in manifest["crops"]]
+    columns = None if columns is None else [c for c in columns if c != "Crop"] + ["Crop"]
+    frames = [load_crop(crop, columns, store_dir, manifest) for crop in crops]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns or [])
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar training-data store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="convert CSV files into the per-crop store")
+    p.add_argument("sources", nargs="+", help="CSV files (e.g. merged.csv)")
+    p.add_argument("--out", default=STORE_DIR, help=f"store directory (default: {STORE_DIR})")
+    p.add_argument("--format", choices=sorted(FORMATS), default=None,
+                   help="file format (default: parquet if pyarrow is installed, else pickle)")
+    p.add_argument("--default-crop", default=None, help="crop name for files without a Crop column (required for them)")
+    p.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="CSV rows read at a time")
+    sub.add_parser("info", help="print the store manifest").add_argument("--store", default=STORE_DIR)
+    args = parser.parse_args()
+    if args.command == "ingest":
+        try:
+            manifest = ingest(args.sources, args.out, args.format, args.default_crop, args.chunksize)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{len(manifest['crops'])} crops written to {args.out} ({manifest['format']})")
+    else:
+        manifest = read_manifest(args.store)
+        for crop, info in sorted(manifest["crops"].items()):
+            print(f"{crop:12s} {info['rows']:8d} rows  {info['file']}")
+
+if __name__ == "__main__":
+    main()
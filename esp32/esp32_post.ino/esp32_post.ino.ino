@@ -1,6 +1,10 @@
 /*
   ESP32 POST sensor data to Flask backend
   Sends temperature, humidity, heat index, soil analog %, and soil digital
+  Readings are buffered and posted as one batch to /sensor/batch; each item
+  carries age_ms so the server can restore its sample time. The batch names
+  the device (its WiFi MAC unless deviceId is set) so several boards can share
+  one server.
 */
 
 #include <WiFi.h>
@@ -18,14 +22,30 @@ const char* ssid = "Your SSID";
 const char* password = "Your Password";
 
 // Flask server IP and port (change to your PC's IP)
-const char* serverUrl = "your-server-ip:5000/sensor-data";
+const char* serverUrl = "http://your-server-ip:5000/sensor/batch";
 const char* apiKey = "your api key";  // must match SENSOR_API_KEY in Flask
+String deviceId = "";                 // leave empty to use the WiFi MAC address
+
+#define BATCH_SIZE 10        // readings per POST (server accepts up to 500)
+#define SAMPLE_INTERVAL 3000 // sample every 3 seconds
+#define MIN_BACKOFF 5000     // first wait after a busy server or failed POST
+#define MAX_BACKOFF 300000   // cap for the doubling wait (5 minutes)
+
+String batchItems[BATCH_SIZE];
+unsigned long batchTimes[BATCH_SIZE];
+int batchCount = 0;
+unsigned long retryAt = 0;   // millis() before which no POST is attempted
+unsigned long backoff = 0;   // current wait, doubled on each consecutive failure
+
 void setup() {
   Serial.begin(115200);
   dht.begin();
   pinMode(SOIL_DIGITAL, INPUT);
 
   delay(1000);
+  WiFi.mode(WIFI_STA);
+  if (deviceId.length() == 0) deviceId = WiFi.macAddress();
+  Serial.println("Device id: " + deviceId);
   WiFi.begin(ssid, password);
   Serial.print("Connecting to WiFi");
   int tries = 0;
@@ -42,50 +62,101 @@ void setup() {
   }
 }
 
+// Keep the buffer and wait before the next POST: the server's Retry-After if it sent
+// one, otherwise a doubling backoff
+void backOff(int retryAfterSeconds) {
+  backoff = backoff == 0 ? MIN_BACKOFF : min(backoff * 2, (unsigned long)MAX_BACKOFF);
+  unsigned long wait = retryAfterSeconds > 0 ? (unsigned long)retryAfterSeconds * 1000 : backoff;
+  retryAt = millis() + wait;
+  Serial.printf("Keeping %d readings, retrying in %lu s\n", batchCount, wait / 1000);
+}
+
+// POST all buffered readings in one request. The buffer is cleared once the server has
+// taken them (2xx) or rejected them for good (4xx); it is kept on 408/429/5xx and on
+// network errors, which the server uses for "busy, retry later".
+void flushBatch() {
+  if (batchCount == 0 || WiFi.status() != WL_CONNECTED) return;
+  if (retryAt != 0 && (long)(millis() - retryAt) < 0) return;
+
+  unsigned long now = millis();
+  String json = "{\"device\":\"" + deviceId + "\",\"readings\":[";
+  for (int i = 0; i < batchCount; i++) {
+    if (i > 0) json += ",";
+    json += batchItems[i];
+    json += ",\"age_ms\":" + String(now - batchTimes[i]) + "}";
+  }
+  json += "]}";
+
+  Serial.println("Posting " + String(batchCount) + " readings");
+
+  HTTPClient http;
+  http.begin(serverUrl);
+  http.addHeader("Content-Type", "application/json");
+  http.addHeader("X-API-KEY", apiKey);
+  const char* responseHeaders[] = {"Retry-After"};
+  http.collectHeaders(responseHeaders, 1);
+  int code = http.POST(json);
+  if (code <= 0) {
+    Serial.printf("POST failed: %s\n", http.errorToString(code).c_str());
+    backOff(0);
+  } else if (code == 408 || code == 429 || code >= 500) {
+    Serial.printf("POST %d (server busy)\n", code);
+    backOff(http.header("Retry-After").toInt());
+  } else {
+    // 2xx stored; other 4xx (bad key, invalid batch) would fail the same way again
+    Serial.printf("POST %d\n", code);
+    batchCount = 0;
+    backoff = 0;
+    retryAt = 0;
+  }
+  http.end();
+}
+
 void loop() {
-  if (WiFi.status() == WL_CONNECTED) {
-    float temperature = dht.readTemperature();
-    float humidity = dht.readHumidity();
-    float heatIndex = dht.computeHeatIndex(temperature, humidity, false); // false = Celsius
+  float temperature = dht.readTemperature();
+  float humidity = dht.readHumidity();
+  float heatIndex = dht.computeHeatIndex(temperature, humidity, false); // false = Celsius
 
-    int soilAnalog = analogRead(SOIL_ANALOG);
-    int soilMoisture = map(soilAnalog, 4095, 0, 0, 100);  // 0–100 %
+  int soilAnalog = analogRead(SOIL_ANALOG);
+  int soilMoisture = map(soilAnalog, 4095, 0, 0, 100);  // 0–100 %
 
-    int soilDigital = digitalRead(SOIL_DIGITAL);
-    String soilStatus = (soilDigital == LOW) ? "Wet" : "Dry";
+  int soilDigital = digitalRead(SOIL_DIGITAL);
+  String soilStatus = (soilDigital == LOW) ? "Wet" : "Dry";
 
-    // Fallbacks if sensor fails
-    if (isnan(temperature) || isnan(humidity)) {
-      temperature = 0.0;
-      humidity = 0.0;
-      heatIndex = 0.0;
+  // Fallbacks if sensor fails
+  if (isnan(temperature) || isnan(humidity)) {
+    temperature = 0.0;
+    humidity = 0.0;
+    heatIndex = 0.0;
+  }
+
+  // Buffer the reading (object left open so flushBatch can append age_ms)
+  String item = "{";
+  item += "\"temperature\":" + String(temperature, 1) + ",";
+  item += "\"humidity\":" + String(humidity, 0) + ",";
+  item += "\"heat_index\":" + String(heatIndex, 1) + ",";
+  item += "\"soil_analog\":" + String(soilMoisture) + ",";
+  item += "\"soil_digital\":\"" + soilStatus + "\"";
+
+  if (batchCount == BATCH_SIZE) {
+    // buffer full and server unreachable: drop the oldest reading
+    for (int i = 1; i < BATCH_SIZE; i++) {
+      batchItems[i - 1] = batchItems[i];
+      batchTimes[i - 1] = batchTimes[i];
     }
+    batchCount--;
+  }
+  batchItems[batchCount] = item;
+  batchTimes[batchCount] = millis();
+  batchCount++;
 
-    // Prepare JSON payload
-    String json = "{";
-    json += "\"temperature\":" + String(temperature, 1) + ",";
-    json += "\"humidity\":" + String(humidity, 0) + ",";
-    json += "\"heat_index\":" + String(heatIndex, 1) + ",";
-    json += "\"soil_analog\":" + String(soilMoisture) + ",";
-    json += "\"soil_digital\":\"" + soilStatus + "\"";
-    json += "}";
-
-    Serial.println("Posting: " + json);
-
-    HTTPClient http;
-    http.begin(serverUrl);
-    http.addHeader("Content-Type", "application/json");
-    http.addHeader("X-API-KEY", apiKey);
-    int code = http.POST(json);
-    if (code > 0) {
-      Serial.printf("POST %d\n", code);
+  if (batchCount == BATCH_SIZE) {
+    if (WiFi.status() == WL_CONNECTED) {
+      flushBatch();
     } else {
-      Serial.printf("POST failed: %s\n", http.errorToString(code).c_str());
+      Serial.println("WiFi not connected");
     }
-    http.end();
-  } else {
-    Serial.println("WiFi not connected");
   }
 
-  delay(3000); // send every 3 seconds
+  delay(SAMPLE_INTERVAL);
 }
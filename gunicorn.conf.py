@@ -0,0 +1,33 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn app:app` (see Procfile)
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# With MODEL_PRELOAD=1 the master imports the app and loads every model once;
+# forked workers then share those pages copy-on-write instead of each
+# unpickling its own copy on first use.
+preload_app = os.environ.get("MODEL_PRELOAD", "0") == "1"
+
+# The preloaded master has also run the schema checks, which leave pooled database
+# connections open; a forked worker must not share the parent's SQLite handles, so it
+# drops the inherited pool (without closing the parent's connections) and opens its own.
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        with app.app.app_context():
+            app.db.engine.dispose(close=False)
+
+# Dashboards hold an /events (SSE) connection open; threaded workers keep one
+# open stream from tying up a whole worker process. Each stream still holds one
+# thread, so a worker accepts at most SSE_MAX_SUBSCRIBERS (default 8) of them and
+# answers 503 beyond that (the dashboard polls instead); keep it well below threads.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+# Workers write metric snapshots to METRICS_DIR (see metrics.py); start each
+# server run from an empty directory so old workers' counters are not summed in.
+def on_starting(server):
+    import shutil
+    metrics_dir = os.environ.get("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "instance", "metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
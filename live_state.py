@@ -0,0 +1,227 @@
+# live_state.py
+"""
+Live sensor state shared by every gunicorn worker.
+
+For each device the store keeps the latest reading and a ring buffer of recent
+readings, plus a global, versioned event log ("reading"/"alert") that workers
+tail to feed their /events subscribers. version(device) is the version of that
+device's newest event, so per-device caches only change with their own device.
+Two implementations share one interface:
+
+  SQLiteLiveState  - a small WAL-mode SQLite file; the default, needs nothing extra
+  RedisLiveState   - any client with the redis-py calls used below (redis.Redis, or
+                     LocalRedis, the in-process stand-in used for memory://)
+
+make_live_state() picks one from a URL: sqlite:///path, redis://host:port/db or memory://.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+HISTORY_SIZE = 200   # readings kept per device
+EVENT_LOG_SIZE = 2000  # events kept for workers tailing the log
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"))
+
+class SQLiteLiveState:
+    def __init__(self, path, history_size=HISTORY_SIZE, event_log_size=EVENT_LOG_SIZE):
+        self.path = path
+        self.history_size = history_size
+        self.event_log_size = event_log_size
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS live_latest (device TEXT PRIMARY KEY, time TEXT, data TEXT);
+                CREATE TABLE IF NOT EXISTS live_history (device TEXT, seq INTEGER, data TEXT,
+                                                         PRIMARY KEY (device, seq));
+                CREATE TABLE IF NOT EXISTS live_events (version INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                        kind TEXT, device TEXT, data TEXT);
+                CREATE TABLE IF NOT EXISTS live_versions (device TEXT PRIMARY KEY, version INTEGER);
+            """)
+
+    def _conn(self):
+        # one connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_readings(self, device, entries):
+        """Append readings (oldest first, each with an IST 'time') for one device."""
+        def write(conn):
+            top = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM live_history WHERE device = ?",
+                               (device,)).fetchone()[0]
+            conn.executemany("INSERT INTO live_history (device, seq, data) VALUES (?, ?, ?)",
+                             [(device, top + i, _dumps(e)) for i, e in enumerate(entries, start=1)])
+            conn.execute("DELETE FROM live_history WHERE device = ? AND seq <= ?",
+                         (device, top + len(entries) - self.history_size))
+            newest = max(entries, key=lambda e: e["time"])
+            conn.execute("""
+                INSERT INTO live_latest (device, time, data) VALUES (?, ?, ?)
+                ON CONFLICT(device) DO UPDATE SET time = excluded.time, data = excluded.data
+                WHERE excluded.time >= live_latest.time
+            """, (device, newest["time"], _dumps(newest)))
+            self._log(conn, [("reading", device, e) for e in entries])
+        self._write(write)
+
+    def record_event(self, kind, device, data):
+        self._write(lambda conn: self._log(conn, [(kind, device, data)]))
+
+    def _log(self, conn, events):
+        conn.executemany("INSERT INTO live_events (kind, device, data) VALUES (?, ?, ?)",
+                         [(kind, device, _dumps(data)) for kind, device, data in events])
+        last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.executemany("""
+            INSERT INTO live_versions (device, version) VALUES (?, ?)
+            ON CONFLICT(device) DO UPDATE SET version = excluded.version
+        """, [(device, last) for device in {device for _, device, _ in events}])
+        conn.execute("DELETE FROM live_events WHERE version <= ? - ?", (last, self.event_log_size))
+
+    def latest(self, device):
+        row = self._conn().execute("SELECT data FROM live_latest WHERE device = ?", (device,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest_device(self):
+        row = self._conn().execute("SELECT device FROM live_latest ORDER BY time DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def history(self, device, limit=HISTORY_SIZE):
+        rows = self._conn().execute(
+            "SELECT data FROM live_history WHERE device = ? ORDER BY seq DESC LIMIT ?", (device, limit)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def version(self, device=None):
+        """Version of the newest event, of one device's newest event if device is given."""
+        if device is not None:
+            row = self._conn().execute("SELECT version FROM live_versions WHERE device = ?", (device,)).fetchone()
+        else:
+            row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'live_events'").fetchone()
+        return row[0] if row else 0
+
+    def events_since(self, version):
+        """[(version, kind, device, data)] logged after `version`, oldest first."""
+        rows = self._conn().execute(
+            "SELECT version, kind, device, data FROM live_events WHERE version > ? ORDER BY version",
+            (version,)).fetchall()
+        return [(v, kind, device, json.loads(data)) for v, kind, device, data in rows]
+
+class RedisLiveState:
+    """Same interface as SQLiteLiveState on top of a redis-like client."""
+    def __init__(self, client, prefix="live", history_size=HISTORY_SIZE, event_log_size=EVENT_LOG_SIZE):
+        self.client = client
+        self.prefix = prefix
+        self.history_size = history_size
+        self.event_log_size = event_log_size
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    def record_readings(self, device, entries):
+        key = self._key("history", device)
+        self.client.lpush(key, *[_dumps(e) for e in entries])
+        self.client.ltrim(key, 0, self.history_size - 1)
+        newest = max(entries, key=lambda e: e["time"])
+        current = self.latest(device)
+        if current is None or newest["time"] >= current["time"]:
+            self.client.hset(self._key("latest"), device, _dumps(newest))
+        self._log([("reading", device, e) for e in entries])
+
+    def record_event(self, kind, device, data):
+        self._log([(kind, device, data)])
+
+    def _log(self, events):
+        last = self.client.incrby(self._key("version"), len(events))
+        first = last - len(events) + 1
+        key = self._key("events")
+        self.client.lpush(key, *[_dumps([first + i, kind, device, data])
+                                 for i, (kind, device, data) in enumerate(events)])
+        self.client.ltrim(key, 0, self.event_log_size - 1)
+        for device in {device for _, device, _ in events}:
+            self.client.hset(self._key("versions"), device, last)
+
+    def latest(self, device):
+        raw = self.client.hget(self._key("latest"), device)
+        return json.loads(raw) if raw else None
+
+    def latest_device(self):
+        latest = {k.decode() if isinstance(k, bytes) else k: json.loads(v)
+                  for k, v in self.client.hgetall(self._key("latest")).items()}
+        return max(latest, key=lambda d: latest[d]["time"]) if latest else None
+
+    def history(self, device, limit=HISTORY_SIZE):
+        return [json.loads(raw) for raw in self.client.lrange(self._key("history", device), 0, limit - 1)]
+
+    def version(self, device=None):
+        if device is not None:
+            return int(self.client.hget(self._key("versions"), device) or 0)
+        return int(self.client.get(self._key("version")) or 0)
+
+    def events_since(self, version):
+        events = [json.loads(raw) for raw in self.client.lrange(self._key("events"), 0, -1)]
+        return [tuple(e) for e in reversed(events) if e[0] > version]
+
+class LocalRedis:
+    """In-process stand-in for the redis-py subset RedisLiveState uses (single process only)."""
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def incrby(self, key, amount=1):
+        with self._lock:
+            self._data[key] = int(self._data.get(key, 0)) + amount
+            return self._data[key]
+
+    def lpush(self, key, *values):
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            items = self._data.get(key, [])
+            self._data[key] = items[start:None if end == -1 else end + 1]
+
+    def lrange(self, key, start, end):
+        items = self._data.get(key, [])
+        return list(items[start:None if end == -1 else end + 1])
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[field] = value
+
+    def hget(self, key, field):
+        return self._data.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self._data.get(key, {}))
+
+def make_live_state(url):
+    if url.startswith("sqlite:///"):
+        return SQLiteLiveState(url[len("sqlite:///"):])
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        import redis  # optional dependency, only needed for this backend
+        return RedisLiveState(redis.Redis.from_url(url))
+    if url == "memory://":
+        return RedisLiveState(LocalRedis())
+    raise ValueError(f"unsupported LIVE_STATE_URL: {url}")
@@ -0,0 +1,152 @@
+# metrics.py
+"""
+In-process counters and latency histograms, exported in Prometheus text format.
+
+Each gunicorn worker keeps its own registry and periodically writes a snapshot
+to snapshot_dir/<pid>.json; render() merges every snapshot so /metrics reports
+the whole server whichever worker answers. Files of exited workers are kept so
+counters never go backwards (the same rule prometheus_client's multiprocess
+mode uses).
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from background import BackgroundThread
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Metrics:
+    def __init__(self, namespace="app", snapshot_dir=None, flush_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.snapshot_dir = snapshot_dir
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._help = {}         # name -> (type, help)
+        self._counters = {}     # (name, label_key) -> value
+        self._histograms = {}   # (name, label_key) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        self._thread = BackgroundThread(self._run, "metrics-flush")
+        # a forked worker starts from zero; what the parent measured is the parent's
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._counters.clear()
+        self._histograms.clear()
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    @contextmanager
+    def span(self, name):
+        """Time a block into the span_duration_seconds histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_duration_seconds", time.perf_counter() - started, span=name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(map(list, labels)), list(h)] for (name, labels), h in self._histograms.items()],
+            }
+
+    # -- multi-process export --
+
+    def start(self):
+        if self.snapshot_dir is not None:
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print("⚠️ Metrics snapshot failed:", e)
+
+    def flush(self):
+        if self.snapshot_dir is None:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def render(self):
+        """Prometheus text exposition of all workers' snapshots (this process's is always fresh)."""
+        snapshots = {os.getpid(): self.snapshot()}
+        if self.snapshot_dir is not None:
+            for path in glob.glob(os.path.join(self.snapshot_dir, "*.json")):
+                pid = int(os.path.basename(path)[:-len(".json")])
+                if pid in snapshots:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots[pid] = json.load(f)
+                except (OSError, ValueError):
+                    continue
+
+        counters, histograms = {}, {}
+        for snap in snapshots.values():
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, h in snap["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(h))
+                for i, v in enumerate(h):
+                    merged[i] += v
+
+        lines = []
+        for name in sorted({n for n, _ in counters} | {n for n, _ in histograms}):
+            full = f"{self.namespace}_{name}"
+            kind, text = self._help.get(name, ("counter" if any(n == name for n, _ in counters) else "histogram", name))
+            lines += [f"# HELP {full} {text}", f"# TYPE {full} {kind}"]
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{full}{_format_labels(labels)} {value}")
+            for (n, labels), h in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(self.buckets, h):
+                    lines.append(f"{full}_bucket{_format_labels(labels + (('le', repr(bound)),))} {count}")
+                lines.append(f"{full}_bucket{_format_labels(labels + (('le', '+Inf'),))} {h[-1]}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {h[-2]}")
+                lines.append(f"{full}_count{_format_labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
@@ -80,10 +80,17 @@ function updateUI(data) {
   }
 }
 
+// ?device=<id> on the page URL follows one ESP32; otherwise the most recently reporting one
+const DEVICE = new URLSearchParams(location.search).get("device");
+function withDevice(url) {
+  if (!DEVICE) return url;
+  return url + (url.includes("?") ? "&" : "?") + "device=" + encodeURIComponent(DEVICE);
+}
+
 // Fetch recommendation (latest)
 async function fetchRecommend() {
   try {
-    const res = await fetch("/recommend");
+    const res = await fetch(withDevice("/recommend"));
     if (!res.ok) throw new Error("No data");
     const data = await res.json();
     updateUI(data);
@@ -92,27 +99,75 @@ async function fetchRecommend() {
   }
 }
 
+// Chart ranges: "live" plots raw recent readings from /history, the others plot
+// per-bucket means from /api/history (aggregated server-side)
+const chartRange = document.getElementById("chartRange");
+const CHART_RANGES = {
+  "1d": { ms: 86400e3, bucket: "5m" },
+  "7d": { ms: 7 * 86400e3, bucket: "1h" },
+  "30d": { ms: 30 * 86400e3, bucket: "1h" },
+  "365d": { ms: 365 * 86400e3, bucket: "1d" }
+};
+let lastAggregateFetch = 0;
+const LIVE_HISTORY_MAX = 200;
+let liveHistory = [];  // newest first, like /history
+
+function setChartData(labels, temp, hum, soil, heat) {
+  sensorChart.data.labels = labels;
+  sensorChart.data.datasets[0].data = temp;
+  sensorChart.data.datasets[1].data = hum;
+  sensorChart.data.datasets[2].data = soil;
+  sensorChart.data.datasets[3].data = heat;
+  sensorChart.update();
+}
+
+function renderLiveChart() {
+  const hist = liveHistory;
+  setChartData(
+    hist.map(h => h.time || ''),
+    hist.map(h => h.temperature ?? null),
+    hist.map(h => h.humidity ?? null),
+    hist.map(h => h.soil ?? null),
+    hist.map(h => h.heat_index ?? null)
+  );
+}
+
 // Update chart with /history (history returns entries with IST 'time')
 async function updateChart() {
+  const range = CHART_RANGES[chartRange.value];
   try {
-    const res = await fetch("/history");
+    if (!range) {
+      const res = await fetch(withDevice("/history"));
+      if (!res.ok) throw new Error("No history");
+      liveHistory = await res.json();
+      renderLiveChart();
+      return;
+    }
+    // aggregated buckets change slowly; refresh at most once a minute
+    if (Date.now() - lastAggregateFetch < 60000) return;
+    lastAggregateFetch = Date.now();
+    const from = new Date(Date.now() - range.ms).toISOString();
+    const res = await fetch(withDevice(`/api/history?bucket=${range.bucket}&from=${encodeURIComponent(from)}`));
     if (!res.ok) throw new Error("No history");
-    const hist = await res.json();
-    sensorChart.data.labels = hist.map(h => h.time || '');
-    sensorChart.data.datasets[0].data = hist.map(h => h.temperature ?? null);
-    sensorChart.data.datasets[1].data = hist.map(h => h.humidity ?? null);
-    sensorChart.data.datasets[2].data = hist.map(h => h.soil ?? null);
-    sensorChart.data.datasets[3].data = hist.map(h => h.heat_index ?? null);
-    sensorChart.update();
+    const points = (await res.json()).points;
+    setChartData(
+      points.map(p => p.time),
+      points.map(p => p.temperature.mean),
+      points.map(p => p.humidity.mean),
+      points.map(p => p.soil.mean),
+      points.map(() => null)
+    );
   } catch (err) {
     console.warn("chart update failed", err);
   }
 }
 
+chartRange.addEventListener("change", () => { lastAggregateFetch = 0; updateChart(); });
+
 // Download CSV (client-side)
 async function downloadHistoryCSV() {
   try {
-    const res = await fetch("/history");
+    const res = await fetch(withDevice("/history"));
     if (!res.ok) throw new Error("No history to download");
     const hist = await res.json();
     // build CSV
@@ -145,8 +200,46 @@ async function downloadHistoryCSV() {
 // wire download button
 downloadBtn.addEventListener('click', downloadHistoryCSV);
 
-// start loops
-fetchRecommend();
-updateChart();
-setInterval(fetchRecommend, 3000);
-setInterval(updateChart, 5000);
+// Polling (fallback when the /events stream is unavailable)
+let pollTimers = [];
+function startPolling() {
+  if (pollTimers.length) return;
+  fetchRecommend();
+  updateChart();
+  pollTimers = [setInterval(fetchRecommend, 3000), setInterval(updateChart, 5000)];
+}
+function stopPolling() {
+  pollTimers.forEach(clearInterval);
+  pollTimers = [];
+}
+
+// Push channel: the server sends readings, recommendations and alerts as they arrive
+function connectEvents() {
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+  const events = new EventSource(withDevice("/events"));
+  events.onopen = () => {
+    stopPolling();
+    updateChart();  // resync once per (re)connect
+  };
+  // the browser keeps retrying; poll until the stream is back. A refused stream (503: the
+  // server is at its live-connection limit) is not retried by the browser: try again later
+  events.onerror = () => {
+    startPolling();
+    if (events.readyState === EventSource.CLOSED) setTimeout(connectEvents, 60000);
+  };
+  events.addEventListener("recommendation", e => updateUI(JSON.parse(e.data)));
+  events.addEventListener("reading", e => {
+    liveHistory.unshift(JSON.parse(e.data));
+    liveHistory.length = Math.min(liveHistory.length, LIVE_HISTORY_MAX);
+    if (chartRange.value === "live") renderLiveChart();
+  });
+  events.addEventListener("alert", () => { alertBanner.style.display = "block"; });
+}
+
+// start
+connectEvents();
+// aggregated ranges are not pushed; refresh them periodically (updateChart throttles to 1/min)
+setInterval(() => { if (chartRange.value !== "live") updateChart(); }, 60000);
@@ -0,0 +1,22 @@
+# tests/conftest.py
+"""Import app against a scratch database, stubbed alert transports and in-memory live state."""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="crops_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+os.environ.setdefault("ALERT_TRANSPORT", "stub")
+os.environ.setdefault("LIVE_STATE_URL", "memory://")
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+
+import pytest
+
+import app as webapp
+
+@pytest.fixture
+def client():
+    return webapp.app.test_client()
@@ -0,0 +1,28 @@
+# tests/test_admin_alerts.py
+import pytest
+
+import app as webapp
+
+@pytest.fixture
+def admin(client):
+    with client.session_transaction() as session:
+        session["admin_authenticated"] = True
+    return client
+
+@pytest.mark.parametrize("body", [{"from": 123}, {"to": ["2024-01-01"]}, {"condition": {"a": 1}}, {"sensor": 5}])
+def test_bulk_resolve_rejects_non_string_filters(admin, body):
+    response = admin.post("/admin/alerts/resolve", json=body)
+    assert response.status_code == 400
+    assert "must be a string" in response.get_json()["message"]
+
+def test_other_count_links_to_alerts_without_a_condition(admin):
+    with webapp.app.app_context():
+        alerts = [webapp.Alert(message="legacy", sensor="other-test", condition=None, notify_status="sent"),
+                  webapp.Alert(message="dry", sensor="other-test", condition="low_soil", notify_status="sent")]
+        webapp.db.session.add_all(alerts)
+        webapp.db.session.commit()
+        legacy_id = alerts[0].id
+    data = admin.get("/admin/alerts?sensor=other-test").get_json()
+    assert data["counts"] == {"other": 1, "low_soil": 1}
+    data = admin.get("/admin/alerts?sensor=other-test&condition=other").get_json()
+    assert [a["id"] for a in data["alerts"]] == [legacy_id]
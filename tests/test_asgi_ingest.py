@@ -0,0 +1,57 @@
+# tests/test_asgi_ingest.py
+import asyncio
+import json
+from datetime import datetime
+
+import asgi_ingest
+
+def test_stop_stores_readings_the_writer_already_took(monkeypatch):
+    stored = []
+    monkeypatch.setattr(asgi_ingest.IngestWriter, "_store", staticmethod(stored.extend))
+
+    async def run():
+        writer = asgi_ingest.IngestWriter(flush_interval=0.5)
+        writer.start()
+        futures = [writer.submit([i]) for i in range(3)]
+        await asyncio.sleep(0.05)  # the writer holds the first reading while the batch fills
+        await writer.stop()
+        return futures
+
+    futures = asyncio.run(run())
+    assert sorted(stored) == [0, 1, 2]
+    assert all(f.done() and f.exception() is None for f in futures)
+
+def run_writer(writer, requests):
+    async def run():
+        writer.start()
+        futures = [writer.submit(readings) for readings in requests]
+        await writer.stop()
+        return futures
+    return asyncio.run(run())
+
+def failing_store(stored):
+    def store(readings):
+        if any(r["device"] == "bad" for r in readings):
+            raise RuntimeError("bad reading")
+        stored.extend(readings)
+    return store
+
+def reading(device):
+    return {"device": device, "temperature": 25.0, "timestamp": datetime(2024, 1, 1)}
+
+def test_failed_batch_stores_the_other_requests(monkeypatch):
+    stored = []
+    monkeypatch.setattr(asgi_ingest.IngestWriter, "_store", staticmethod(failing_store(stored)))
+    writer = asgi_ingest.IngestWriter(flush_interval=0.01, retries=1, retry_delay=0.001, ack="commit")
+    futures = run_writer(writer, [[reading("a")], [reading("bad")], [reading("b")]])
+    assert sorted(r["device"] for r in stored) == ["a", "b"]
+    assert [f.exception() is None for f in futures] == [True, False, True]
+
+def test_acknowledged_readings_that_cannot_be_stored_go_to_the_dead_letter_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(asgi_ingest.IngestWriter, "_store", staticmethod(failing_store([])))
+    path = tmp_path / "failed.jsonl"
+    writer = asgi_ingest.IngestWriter(flush_interval=0.01, retries=1, retry_delay=0.001, ack="queued",
+                                      dead_letter=str(path))
+    run_writer(writer, [[reading("a")], [reading("bad")]])
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines == [{"device": "bad", "temperature": 25.0, "timestamp": "2024-01-01T00:00:00"}]
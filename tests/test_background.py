@@ -0,0 +1,25 @@
+# tests/test_background.py
+import os
+import threading
+
+from background import BackgroundThread
+
+def test_started_once_per_process():
+    stop = threading.Event()
+    thread = BackgroundThread(stop.wait, "test-background")
+    try:
+        assert thread.start() is True
+        assert thread.start() is False
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # the child inherits the object but not its thread
+            started = thread.running() is False and thread.start() is True and thread.start() is False
+            os.write(write_fd, b"1" if started else b"0")
+            os._exit(0)
+        os.close(write_fd)
+        assert os.read(read_fd, 1) == b"1"
+        os.waitpid(pid, 0)
+        assert thread.running()
+    finally:
+        stop.set()
@@ -0,0 +1,28 @@
+# tests/test_compact_forest.py
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from compact_forest import CompactForest, check_parity, flatten_forest, save_forest
+
+def fitted_forest():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"Year": rng.integers(2000, 2024, 400), "Month": rng.integers(1, 13, 400),
+                      "Rainfall": rng.normal(800, 200, 400)})
+    y = 50 * (X["Year"] - 2000) + 30 * np.sin(X["Month"]) + 0.1 * X["Rainfall"] + rng.normal(0, 5, 400)
+    model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0)
+    model.fit(X[:300], y[:300])
+    return model, X[300:]
+
+def test_reloaded_forest_matches_sklearn(tmp_path):
+    model, held_out = fitted_forest()
+    path = tmp_path / "crop_forest.npz"
+    save_forest(flatten_forest(model), path)
+    forest = CompactForest.load(path)
+
+    assert list(forest.feature_names_in_) == list(model.feature_names_in_)
+    assert np.allclose(forest.predict(held_out), model.predict(held_out))
+    assert np.allclose(forest.predict(held_out.iloc[:1]), model.predict(held_out.iloc[:1]))
+    assert forest.predict(held_out.iloc[:1]).shape == (1,)
+    assert np.allclose(forest.predict(held_out.values), model.predict(held_out))
+    check_parity(model, forest, held_out)
@@ -0,0 +1,37 @@
+# tests/test_crop_rules.py
+import itertools
+
+import numpy as np
+
+import app as webapp
+
+def if_chain(temp, hum, soil, soil_status):
+    """recommend_crop as it was written before CROP_RULES, returning the rule key."""
+    if soil_status == "Wet" and soil > 70 and hum > 50 and 20 < temp < 35:
+        return "rice"
+    if soil_status == "Dry" and soil > 50 and hum < 60 and 18 < temp < 30:
+        return "wheat"
+    if soil > 40 and hum > 40 and 22 < temp < 28:
+        return "maize"
+    if soil < 30 and temp > 25:
+        return "millet"
+    return "potato"
+
+NAN = float("nan")
+GRID = list(itertools.product(
+    [NAN, -5, 17.9, 18, 18.1, 20, 22, 25, 25.1, 28, 30, 35, 40],  # temperature
+    [NAN, 0, 39.9, 40, 40.1, 50, 50.1, 60, 60.1, 100],            # humidity
+    [NAN, 0, 29.9, 30, 40, 40.1, 50, 50.1, 70, 70.1, 100],        # soil
+    ["Wet", "Dry", "Unknown"]))
+
+def test_rule_table_matches_the_if_chain_including_nan():
+    expected = [if_chain(*reading) for reading in GRID]
+    table = webapp.crop_rules
+    scalar = [table.keys[table.payloads.index(table.recommend(*reading))] for reading in GRID]
+    temperature, humidity, soil, status = zip(*GRID)
+    batch = [table.keys[i] for i in table.match(np.array(temperature), np.array(humidity), np.array(soil), status)]
+    assert scalar == expected
+    assert batch == expected
+
+def test_nan_humidity_ignored_by_rules_that_do_not_test_it():
+    assert webapp.recommend_crop(30, NAN, 10, "Dry")["name"].startswith("Millet")
@@ -0,0 +1,21 @@
+# tests/test_data_store.py
+import pandas as pd
+import pytest
+
+import data_store
+
+def single_crop_csv(tmp_path):
+    path = tmp_path / "updated_dataset.csv"
+    pd.DataFrame({"Month": [1, 2, 3], "Year": [2020, 2020, 2020], "WPI": [100.0, 101.0, 102.0],
+                  "Rainfall": [700.0, 800.0, 900.0]}).to_csv(path, index=False)
+    return str(path)
+
+def test_ingest_without_crop_column_needs_default_crop(tmp_path):
+    with pytest.raises(ValueError, match="--default-crop"):
+        data_store.ingest([single_crop_csv(tmp_path)], str(tmp_path / "store"), "pickle")
+    assert not (tmp_path / "store" / "updated_dataset.pkl").exists()
+
+def test_ingest_labels_crop_less_file_with_default_crop(tmp_path):
+    manifest = data_store.ingest([single_crop_csv(tmp_path)], str(tmp_path / "store"), "pickle", default_crop="Wheat")
+    assert list(manifest["crops"]) == ["Wheat"]
+    assert len(data_store.load_crop("Wheat", ["Year", "WPI"], str(tmp_path / "store"))) == 3
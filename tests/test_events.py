@@ -0,0 +1,30 @@
+# tests/test_events.py
+import app as webapp
+
+def subscribed_device(client, query=""):
+    response = client.get("/events" + query, buffered=False)
+    try:
+        (device,) = webapp.broadcaster._subscribers.values()
+        return device
+    finally:
+        response.close()
+
+def test_events_follow_the_latest_device_by_default(client):
+    client.post("/sensor", json={"device": "events-a", "temperature": 25, "humidity": 50, "soil": 40},
+                headers={"X-API-KEY": webapp.SENSOR_API_KEY})
+    assert subscribed_device(client) == webapp.live_state.latest_device()
+    assert subscribed_device(client, "?device=events-b") == "events-b"
+    assert subscribed_device(client, "?device=*") is None
+
+def test_events_refused_beyond_the_subscriber_limit(client, monkeypatch):
+    monkeypatch.setattr(webapp.broadcaster, "max_subscribers", 1)
+    first = client.get("/events?device=*", buffered=False)
+    try:
+        refused = client.get("/events?device=*")
+        assert refused.status_code == 503
+        assert refused.headers["Retry-After"]
+    finally:
+        first.close()
+    second = client.get("/events?device=*", buffered=False)
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,20 @@
+# tests/test_history.py
+from datetime import datetime
+
+import app as webapp
+
+def test_api_history_is_scoped_to_the_device(client):
+    now = datetime.utcnow()
+    with webapp.app.app_context():
+        webapp.ingest_readings([webapp.parse_reading({"device": device, "temperature": t, "humidity": 50, "soil": 40,
+                                                      "soil_status": "Wet"}, now)
+                                for device, t in [("hist-a", 10), ("hist-a", 20), ("hist-b", 40)]])
+
+    def last_point(query):
+        return client.get("/api/history?bucket=1m" + query).get_json()["points"][-1]
+
+    assert last_point("&device=hist-a")["temperature"] == {"min": 10.0, "mean": 15.0, "max": 20.0}
+    assert last_point("&device=hist-b")["count"] == 1
+    assert last_point("&device=*")["count"] >= 3
+    assert last_point("") == last_point(f"&device={webapp.live_state.latest_device()}")
+    assert client.get("/api/history?bucket=1m&device=nobody").get_json()["points"] == []
@@ -0,0 +1,58 @@
+# tests/test_price_forecast.py
+import numpy as np
+import pytest
+
+import app as webapp
+
+def forecast(client, crop, year_from, year_to, query):
+    response = client.get(f"/api/price/forecast?crop={crop}&from={year_from}&to={year_to}&{query}")
+    assert response.status_code == 200, response.get_json()
+    return {(row["year"], row["month"]): row for row in response.get_json()["forecast"]}
+
+@pytest.mark.parametrize("scenario", ["normal", "excessive", "deficient", None])
+def test_forecast_is_continuous_past_the_precomputed_years(client, scenario):
+    model_set = webapp.model_registry.current
+    for crop in model_set.crop_names:
+        cube = model_set.forecast_cubes[crop]
+        last = int(cube.years[-1])
+        # None: a rainfall query, answered from the cube
+        query = f"scenario={scenario}" if scenario else f"rainfall={model_set.thresholds[crop]['mean_rainfall']:.1f}"
+        rows = forecast(client, crop, last - 1, last + 2, query)
+        assert rows[(last, 1)]["source"] in ("table", "cube")
+        assert rows[(last + 1, 1)]["source"] == "model"
+        # past the training years the forest is flat in Year, so only annual growth moves the series
+        growth = 1 + cube.adjustment.annual_growth
+        for month in range(1, 13):
+            for year in (last, last + 1):
+                assert rows[(year + 1, month)]["wpi"] == pytest.approx(rows[(year, month)]["wpi"] * growth, rel=1e-3)
+
+def test_forecast_without_saved_adjustment_rejects_years_outside_the_cube(client, monkeypatch):
+    model_set = webapp.model_registry.current
+    crop = model_set.crop_names[0]
+    monkeypatch.setattr(model_set.forecast_cubes[crop], "adjustment", None)
+    last = int(model_set.forecast_cubes[crop].years[-1])
+    rainfall = model_set.thresholds[crop]['mean_rainfall']
+    assert client.get(f"/api/price/forecast?crop={crop}&from={last}&to={last}&rainfall={rainfall}").status_code == 200
+    response = client.get(f"/api/price/forecast?crop={crop}&from={last}&to={last + 1}&rainfall={rainfall}")
+    assert response.status_code == 400
+    assert "retrain" in response.get_json()["message"]
+
+@pytest.mark.parametrize("year_from, year_to", [(20000, 20000), (-5000, -5000), (1, 10)])
+def test_forecast_rejects_years_far_outside_the_precomputed_range(client, year_from, year_to):
+    crop = webapp.model_registry.current.crop_names[0]
+    response = client.get(f"/api/price/forecast?crop={crop}&from={year_from}&to={year_to}&scenario=normal")
+    assert response.status_code == 400
+    assert "cover" in response.get_json()["message"]
+
+def test_forecast_accepts_the_edge_of_the_window(client):
+    model_set = webapp.model_registry.current
+    crop = model_set.crop_names[0]
+    first, last = webapp.forecast_year_window(crop, model_set)
+    rows = forecast(client, crop, last, last, "scenario=normal")
+    assert all(np.isfinite(row["wpi"]) for row in rows.values())
+    response = client.get(f"/api/price/forecast?crop={crop}&from={last + 1}&to={last + 1}&scenario=normal")
+    assert response.status_code == 400
+
+def test_forecast_rejects_non_finite_rainfall(client):
+    crop = webapp.model_registry.current.crop_names[0]
+    assert client.get(f"/api/price/forecast?crop={crop}&rainfall=inf").status_code == 400
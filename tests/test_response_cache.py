@@ -0,0 +1,21 @@
+# tests/test_response_cache.py
+import pytest
+
+import app as webapp
+
+HEADERS = {"X-API-KEY": webapp.SENSOR_API_KEY}
+
+def post_reading(client, device):
+    response = client.post("/sensor", json={"device": device, "temperature": 25, "humidity": 50, "soil": 40},
+                           headers=HEADERS)
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("endpoint", ["/latest-sensor", "/history", "/recommend"])
+def test_other_devices_readings_keep_the_etag(client, endpoint):
+    post_reading(client, "etag-d1")
+    post_reading(client, "etag-d2")
+    etag = client.get(f"{endpoint}?device=etag-d2").headers["ETag"]
+    post_reading(client, "etag-d1")
+    assert client.get(f"{endpoint}?device=etag-d2", headers={"If-None-Match": etag}).status_code == 304
+    post_reading(client, "etag-d2")
+    assert client.get(f"{endpoint}?device=etag-d2", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,22 @@
+# tests/test_sensor_ingest.py
+import pytest
+
+import app as webapp
+
+HEADERS = {"X-API-KEY": webapp.SENSOR_API_KEY, "Content-Type": "application/json"}
+
+@pytest.mark.parametrize("item", ['{"temperature": NaN}', '{"humidity": Infinity}', '{"soil": Infinity}',
+                                  '{"temperature": "nan"}', '{"age_ms": 1e30}', '{"age_ms": Infinity}',
+                                  '{"age_ms": -1}'])
+def test_batch_rejects_non_finite_values_per_item(client, item):
+    body = '{"device": "finite-test", "readings": [%s, {"temperature": 25, "humidity": 50, "soil": 40}]}' % item
+    response = client.post("/sensor/batch", data=body, headers=HEADERS)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["status"] == "partial"
+    assert data["accepted"] == 1
+    assert data["errors"] == [{"index": 0, "message": "bad values"}]
+
+def test_single_reading_with_nan_is_a_400(client):
+    response = client.post("/sensor", data='{"temperature": NaN, "humidity": 50}', headers=HEADERS)
+    assert response.status_code == 400
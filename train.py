@@ -7,7 +7,16 @@ from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+import json
+import time
+import hashlib
+import shutil
+import argparse
 import warnings
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from compact_forest import flatten_forest, save_forest, CompactForest, check_parity
+import data_store
 warnings.filterwarnings('ignore')
 
 # Create models directory if it doesn't exist
@@ -40,14 +49,39 @@ ANNUAL_GROWTH_RATES = {
     'Ragi': 0.042  # 4.2% annual growth
 }
 
+# Future prediction grid
+FORECAST_YEARS = range(2018, 2029)
+FORECAST_RAINFALL_POINTS = 41  # rainfall resolution of the forecast cube
+
 # Rainfall impact factors
 RAINFALL_IMPACT = {
     'excessive': 0.35,  # 35% price increase for excessive rainfall
     'deficient': 0.40,  # 40% price increase for deficient rainfall
 }
 
-def train_crop_model(crop_name, crop_data):
-    """Train a model for a specific crop and save it."""
+# RandomForestRegressor settings, shared with backtest.py
+MODEL_PARAMS = {'n_estimators': 100, 'random_state': 42}
+
+# columns train_crop_model needs from the data store
+TRAINING_COLUMNS = ['Month', 'Year', 'Rainfall', 'WPI', 'Rainfall_Category', 'Rainfall_Deviation']
+
+# Incremental retraining: trees added per warm start when months are appended, and the
+# forest size at which the next change triggers a full rebuild instead
+WARM_START_TREES = 20
+MAX_WARM_START_ESTIMATORS = 2 * MODEL_PARAMS['n_estimators']
+# bump when train_crop_model's features or artifacts change, to force a full rebuild
+ARTIFACT_VERSION = 2
+
+def train_crop_model(crop_name, crop_data, out_dir='models', n_jobs=None, derived=False, base=None):
+    """
+    Train a model for a specific crop and save its artifacts to out_dir.
+    derived=True means crop_data comes from the data store with Rainfall_Category and
+    Rainfall_Deviation already computed (same definitions as below).
+
+    base=(model, thresholds) continues a previous version's forest with warm_start:
+    WARM_START_TREES trees are added, fit on all rows. The rainfall mean/std the existing
+    trees were built on are kept, so old and new trees see the same features.
+    """
     print(f"Training model for {crop_name}...")
     
     # Determine which columns to use
@@ -60,17 +94,22 @@ def train_crop_model(crop_name, crop_data):
     min_rainfall = crop_data[rainfall_col].min()
     max_rainfall = crop_data[rainfall_col].max()
     
+    if base is not None:
+        mean_rainfall, std_rainfall = base[1]['mean_rainfall'], base[1]['std_rainfall']
+        derived = False
+
     # Calculate more precise thresholds based on historical data
     deficient_threshold = mean_rainfall - 0.75 * std_rainfall
     excessive_threshold = mean_rainfall + 0.75 * std_rainfall
     
-    # Add rainfall category as a feature
-    crop_data['Rainfall_Category'] = 0  # Default to normal
-    crop_data.loc[crop_data[rainfall_col] > excessive_threshold, 'Rainfall_Category'] = 1  # Excessive
-    crop_data.loc[crop_data[rainfall_col] < deficient_threshold, 'Rainfall_Category'] = -1  # Deficient
-    
-    # Add rainfall deviation from mean as a feature
-    crop_data['Rainfall_Deviation'] = crop_data[rainfall_col] - mean_rainfall
+    if not derived:
+        # Add rainfall category as a feature
+        crop_data['Rainfall_Category'] = 0  # Default to normal
+        crop_data.loc[crop_data[rainfall_col] > excessive_threshold, 'Rainfall_Category'] = 1  # Excessive
+        crop_data.loc[crop_data[rainfall_col] < deficient_threshold, 'Rainfall_Category'] = -1  # Deficient
+
+        # Add rainfall deviation from mean as a feature
+        crop_data['Rainfall_Deviation'] = crop_data[rainfall_col] - mean_rainfall
     
     # Get min and max years for future predictions
     min_year = crop_data['Year'].min()
@@ -85,11 +124,17 @@ def train_crop_model(crop_name, crop_data):
     y = crop_data[wpi_col]
     
     # Train a Random Forest model
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    if base is not None:
+        model = base[0]
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + WARM_START_TREES, n_jobs=n_jobs)
+    else:
+        model = RandomForestRegressor(**MODEL_PARAMS, n_jobs=n_jobs)
     model.fit(X, y)
+    # serving predicts a few rows at a time; thread fan-out would only add overhead there
+    model.set_params(n_jobs=None, warm_start=False)
     
     # Save the model
-    joblib.dump(model, f'models/{crop_name}_rainfall_model.pkl')
+    joblib.dump(model, os.path.join(out_dir, f'{crop_name}_rainfall_model.pkl'))
     
     # Save thresholds and statistics
     thresholds = {
@@ -104,10 +149,13 @@ def train_crop_model(crop_name, crop_data):
         'min_year': min_year,
         'max_year': max_year
     }
-    joblib.dump(thresholds, f'models/{crop_name}_thresholds.pkl')
+    joblib.dump(thresholds, os.path.join(out_dir, f'{crop_name}_thresholds.pkl'))
+    
+    # Save the flattened forest used by the web app for fast inference
+    export_compact_model(crop_name, model, thresholds, features, X, out_dir)
     
     # Generate future predictions (2018-2028)
-    generate_future_predictions(crop_name, model, thresholds, features)
+    generate_future_predictions(crop_name, model, thresholds, features, out_dir)
     
     # Save feature importance
     feature_importance = pd.DataFrame({
@@ -115,13 +163,38 @@ def train_crop_model(crop_name, crop_data):
         'importance': model.feature_importances_
     }).sort_values('importance', ascending=False)
     
-    joblib.dump(feature_importance, f'models/{crop_name}_importance.pkl')
+    joblib.dump(feature_importance, os.path.join(out_dir, f'{crop_name}_importance.pkl'))
     
     print(f"Model for {crop_name} trained and saved successfully!")
     return model, thresholds
 
-def generate_future_predictions(crop_name, model, thresholds, features):
-    """Generate future price predictions for years 2018-2028."""
+def feature_grid(years, months, rainfall, thresholds, features):
+    """Feature rows for every (year, month, rainfall) combination, year-major, categories as in training."""
+    y, m, r = [a.ravel() for a in np.meshgrid(years, months, rainfall, indexing='ij')]
+    category = np.where(r > thresholds['excessive_threshold'], 1,
+                        np.where(r < thresholds['deficient_threshold'], -1, 0))
+    return pd.DataFrame({
+        'Month': m,
+        'Year': y,
+        features[2]: r,
+        'Rainfall_Category': category,
+        'Rainfall_Deviation': r - thresholds['mean_rainfall'],
+    })[features]
+
+def generate_future_predictions(crop_name, model, thresholds, features, out_dir='models',
+                                years=FORECAST_YEARS, rainfall_points=FORECAST_RAINFALL_POINTS, write_table=True):
+    """
+    Generate future price predictions (default 2018-2028).
+
+    Writes two artifacts from a single model.predict call:
+      {crop}_future_predictions.pkl  - monthly table at the crop's optimal rainfall with
+                                       normal/excessive/deficient scenario columns
+      {crop}_forecast_cube.npz       - dense (year x month x rainfall) WPI cube over the
+                                       observed rainfall range, for serving-side interpolation
+    Both get the same annual growth and MSP alignment. The cube also records that
+    post-processing (base_year, annual_growth, adjustment_factor and the scenario impacts)
+    so the app can apply it to live predictions for years outside the grid.
+    """
     print(f"Generating future predictions for {crop_name}...")
     
     # Get the optimal rainfall for this crop
@@ -133,44 +206,38 @@ def generate_future_predictions(crop_name, model, thresholds, features):
     # Get the MSP (Minimum Support Price) for this crop
     msp = MSP_DATA.get(crop_name, None)
     
-    # Create a dataframe for future years (2018-2028)
-    future_years = range(2018, 2029)
-    future_data = []
+    years = np.asarray(list(years))
+    months = np.arange(1, 13)
+    # (a crop with a single observed rainfall value gets a one-point axis)
+    rainfall = np.unique(np.linspace(thresholds['min_rainfall'], thresholds['max_rainfall'], rainfall_points))
     
-    for year in future_years:
-        # For each month in the year
-        for month in range(1, 13):
-            # Use optimal rainfall for prediction
-            rainfall = optimal_rainfall
-            
-            # Create a row with features
-            row = {
-                'Year': year,
-                'Month': month,
-                features[2]: rainfall,  # Rainfall column
-                'Rainfall_Category': 0,  # Normal rainfall
-                'Rainfall_Deviation': 0  # No deviation from mean
-            }
-            
-            future_data.append(row)
-    
-    future_df = pd.DataFrame(future_data)
+    # Scenario table: optimal rainfall with normal category and no deviation from mean
+    table_years, table_months = [a.ravel() for a in np.meshgrid(years, months, indexing='ij')]
+    future_df = pd.DataFrame({
+        'Year': table_years,
+        'Month': table_months,
+        features[2]: optimal_rainfall,  # Rainfall column
+        'Rainfall_Category': 0,  # Normal rainfall
+        'Rainfall_Deviation': 0  # No deviation from mean
+    })
+    grid = feature_grid(years, months, rainfall, thresholds, features)
     
-    # Make predictions using the model
-    base_predictions = model.predict(future_df[features])
-    future_df['Base_WPI'] = base_predictions
+    # Make predictions for the table and the whole cube in one call
+    predictions = model.predict(pd.concat([future_df[features], grid], ignore_index=True))
+    future_df['Base_WPI'] = predictions[:len(future_df)]
+    cube = predictions[len(future_df):].reshape(len(years), len(months), len(rainfall))
     
     # Apply time series adjustment for future years
     base_year = thresholds['max_year']
     future_df['Years_Beyond_Base'] = future_df['Year'] - base_year
     
     # Calculate adjusted WPI with annual growth
-    future_df['Predicted_WPI'] = future_df.apply(
-        lambda row: row['Base_WPI'] * (1 + annual_growth) ** max(0, row['Years_Beyond_Base']), 
-        axis=1
-    )
+    growth = (1 + annual_growth) ** np.maximum(0, years - base_year)
+    future_df['Predicted_WPI'] = future_df['Base_WPI'] * np.repeat(growth, len(months))
+    cube = cube * growth[:, None, None]
     
     # If we have MSP data, ensure predictions align with it
+    adjustment_factor = 1.0
     if msp is not None:
         # Convert MSP to WPI (approximate)
         msp_wpi = msp / 25  # Using the same conversion factor as in web_interface.py
@@ -184,6 +251,7 @@ def generate_future_predictions(crop_name, model, thresholds, features):
             
             # Apply adjustment to all predictions
             future_df['Predicted_WPI'] = future_df['Predicted_WPI'] * adjustment_factor
+            cube = cube * adjustment_factor
     
     # Generate predictions for different rainfall scenarios
     # Normal rainfall (already in Predicted_WPI)
@@ -193,36 +261,273 @@ def generate_future_predictions(crop_name, model, thresholds, features):
     future_df['Deficient_WPI'] = future_df['Predicted_WPI'] * (1 + RAINFALL_IMPACT['deficient'])
     
     # Save the future predictions
-    joblib.dump(future_df, f'models/{crop_name}_future_predictions.pkl')
+    if write_table:
+        joblib.dump(future_df, os.path.join(out_dir, f'{crop_name}_future_predictions.pkl'))
+    np.savez(os.path.join(out_dir, f'{crop_name}_forecast_cube.npz'),
+             years=years, months=months, rainfall=rainfall, wpi=cube,
+             base_year=base_year, annual_growth=annual_growth, adjustment_factor=adjustment_factor,
+             excessive_impact=RAINFALL_IMPACT['excessive'], deficient_impact=RAINFALL_IMPACT['deficient'])
     
     print(f"Future predictions for {crop_name} generated successfully!")
     return future_df
 
-def train_all_models():
-    """Train models for all crops in the dataset."""
+def parity_grid(thresholds, features):
+    """Feature rows across all months, the training years (+10) and the observed rainfall range."""
+    years = np.arange(int(thresholds['min_year']), int(thresholds['max_year']) + 11)
+    rainfall = np.linspace(thresholds['min_rainfall'], thresholds['max_rainfall'], 25)
+    return feature_grid(years, np.arange(1, 13), rainfall, thresholds, features)
+
+def export_compact_model(crop_name, model, thresholds, features, X=None, out_dir='models'):
+    """Save {crop}_forest.npz and check it predicts exactly like the sklearn model."""
+    arrays = flatten_forest(model)
+    check_X = parity_grid(thresholds, features)
+    if X is not None:
+        check_X = pd.concat([X[features], check_X], ignore_index=True)
+    max_diff = check_parity(model, CompactForest(arrays), check_X)
+    save_forest(arrays, os.path.join(out_dir, f'{crop_name}_forest.npz'))
+    print(f"Compact forest for {crop_name} exported ({len(arrays['value'])} nodes, max diff {max_diff:.2g})")
+
+def export_existing_models():
+    """Export serving artifacts (compact forest, forecast cube) for the models already in models/."""
+    for f in sorted(os.listdir('models')):
+        if not f.endswith('_rainfall_model.pkl'):
+            continue
+        crop_name = f[:-len('_rainfall_model.pkl')]
+        model = joblib.load(f'models/{f}')
+        thresholds = joblib.load(f'models/{crop_name}_thresholds.pkl')
+        features = list(model.feature_names_in_)
+        export_compact_model(crop_name, model, thresholds, features)
+        # the existing scenario tables are kept as they are; only the cube is (re)built
+        generate_future_predictions(crop_name, model, thresholds, features, write_table=False)
+
+def config_fingerprint(crop_name):
+    """Hash of everything besides the data that goes into a crop's artifacts."""
+    config = [ARTIFACT_VERSION, MODEL_PARAMS, list(FORECAST_YEARS), FORECAST_RAINFALL_POINTS, RAINFALL_IMPACT,
+              MSP_DATA.get(crop_name), RAINFALL_RANGES.get(crop_name), ANNUAL_GROWTH_RATES.get(crop_name)]
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def _warm_start_base(crop_name, crop_data, previous):
+    """
+    (model, thresholds) of the previous version when crop_data is the rows it was trained on
+    followed by later months only; None when the old rows changed or earlier months were
+    back-filled, which needs a full retrain.
+    """
+    rows = previous['rows']
+    if len(crop_data) <= rows or data_store.fingerprint(crop_data, rows) != previous['data_fingerprint']:
+        return None
+    period = crop_data['Year'] * 12 + crop_data['Month']
+    if period.iloc[rows:].min() <= period.iloc[:rows].max():
+        return None
+    model = joblib.load(os.path.join(previous['dir'], f'{crop_name}_rainfall_model.pkl'))
+    rainfall_col = 'Rainfall_x' if 'Rainfall_x' in crop_data.columns else 'Rainfall'
+    if list(model.feature_names_in_) != ['Month', 'Year', rainfall_col, 'Rainfall_Category', 'Rainfall_Deviation']:
+        return None
+    return model, joblib.load(os.path.join(previous['dir'], f'{crop_name}_thresholds.pkl'))
+
+def _train_crop_job(crop_name, crop_data, out_dir, n_jobs, store_dir=None, warm_from=None):
+    """Process-pool entry point: train one crop; returns (seconds, mode, n_estimators)."""
+    start = time.perf_counter()
+    if store_dir is not None:
+        # read in the worker, so only this crop's columns are ever loaded or pickled
+        crop_data = data_store.load_crop(crop_name, TRAINING_COLUMNS, store_dir)
+    base = _warm_start_base(crop_name, crop_data, warm_from) if warm_from else None
+    model, _ = train_crop_model(crop_name, crop_data, out_dir, n_jobs, derived=store_dir is not None, base=base)
+    return time.perf_counter() - start, 'warm_start' if base else 'full', model.n_estimators
+
+def _link_or_copy(src, dst):
     try:
-        # Load the merged dataset
-        merged_data = pd.read_csv("merged.csv")
-        
-        # Check if 'Crop' column exists
-        if 'Crop' in merged_data.columns:
-            # Get unique crop names
-            crops = merged_data['Crop'].unique()
-            
-            for crop in crops:
-                # Filter data for this crop
-                crop_data = merged_data[merged_data['Crop'] == crop]
-                
-                # Train model for this crop
-                train_crop_model(crop, crop_data)
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def read_published_manifest(models_dir='models'):
+    try:
+        with open(os.path.join(models_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def plan_crop(crop_name, data_fingerprint, rows, previous, versions_dir):
+    """
+    How to build a crop given the published manifest: 'reuse' the previous artifacts when
+    the data and config fingerprints match, 'warm_start' when rows were added under the
+    same config (checked again in the worker), else 'full'. Returns (mode, previous info).
+    """
+    info = previous.get('crops', {}).get(crop_name)
+    if not info or info.get('config_fingerprint') != config_fingerprint(crop_name):
+        return 'full', None
+    prev_dir = os.path.join(versions_dir, previous['version'])
+    prev = dict(info, dir=prev_dir)
+    if not all(os.path.exists(os.path.join(prev_dir, f)) for f in info['files']):
+        return 'full', None
+    if info.get('data_fingerprint') == data_fingerprint:
+        return 'reuse', prev
+    if rows > info.get('rows', rows) and info.get('n_estimators', 0) + WARM_START_TREES <= MAX_WARM_START_ESTIMATORS:
+        return 'warm_start', prev
+    return 'full', None
+
+def _atomic_copy(src, dst):
+    tmp = dst + '.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def write_manifest(path, manifest):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+def publish_version(version_dir, models_dir='models'):
+    """
+    Copy a finished version into models/ (where app.py reads) one file at a time with
+    os.replace, so a reader never sees a half-written artifact, then update manifest.json.
+    """
+    manifest_path = os.path.join(version_dir, 'manifest.json')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    for info in manifest['crops'].values():
+        for name in info['files']:
+            _atomic_copy(os.path.join(version_dir, name), os.path.join(models_dir, name))
+    write_manifest(os.path.join(models_dir, 'manifest.json'), manifest)
+
+def train_all_models(data_path="merged.csv", workers=None, n_jobs=None, models_dir='models', max_mape=None, full=False):
+    """
+    Train every crop in the dataset in parallel and publish the result as a new version.
+
+    data_path is a CSV file or a data store directory (see data_store.py); with a
+    store each worker reads only its own crop's training columns.
+
+    Crops fan out over a process pool of `workers` processes (default: one per crop,
+    capped at the core count); each forest is fit with n_jobs threads (default: the
+    cores left per worker). Artifacts are written to models/versions/.<version>.tmp,
+    renamed to models/versions/<version> once every crop has succeeded, then published.
+
+    Crops are incremental against the published manifest (see plan_crop): unchanged crops
+    reuse their artifacts, appended months warm-start the existing forest, and only other
+    changes retrain from scratch. full=True retrains everything.
+
+    With max_mape (a fraction, e.g. 0.15) the version is first backtested (see backtest.py)
+    and only published if every crop's rolling-origin MAPE is within it; otherwise it stays
+    in models/versions/ with promoted: false and the served models are left alone.
+    """
+    try:
+        store_dir = data_path if os.path.isdir(data_path) else None
+        if store_dir is not None:
+            # columnar store: workers load their own crop (see _train_crop_job)
+            store = data_store.read_manifest(store_dir)
+            jobs = {crop: None for crop in sorted(store['crops'])}
+            # stores built before fingerprints were recorded are hashed here
+            fingerprints = {crop: info.get('fingerprint') or data_store.fingerprint(
+                                data_store.load_crop(crop, data_store.RAW_COLUMNS, store_dir, store))
+                            for crop, info in store['crops'].items()}
+            rows = {crop: info['rows'] for crop, info in store['crops'].items()}
         else:
-            # If no Crop column, assume single crop dataset
-            crop_name = os.path.basename(os.getcwd())  # Use directory name as crop name
-            train_crop_model(crop_name, merged_data)
-        
-        print("All models trained successfully!")
+            # Load the merged dataset
+            merged_data = pd.read_csv(data_path)
+
+            # Check if 'Crop' column exists
+            if 'Crop' in merged_data.columns:
+                # Filter data for each crop
+                jobs = {crop: merged_data[merged_data['Crop'] == crop].copy() for crop in merged_data['Crop'].unique()}
+            else:
+                # If no Crop column, assume single crop dataset
+                crop_name = os.path.basename(os.getcwd())  # Use directory name as crop name
+                jobs = {crop_name: merged_data}
+            fingerprints = {crop: data_store.fingerprint(data) for crop, data in jobs.items()}
+            rows = {crop: len(data) for crop, data in jobs.items()}
+
+        versions_dir = os.path.join(models_dir, 'versions')
+        previous = {} if full else read_published_manifest(models_dir)
+        plans = {crop: plan_crop(crop, fingerprints[crop], rows[crop], previous, versions_dir) for crop in jobs}
+        to_train = [crop for crop, (mode, _) in plans.items() if mode != 'reuse']
+
+        cores = os.cpu_count() or 1
+        workers = workers or max(1, min(len(to_train), cores))
+        n_jobs = n_jobs or max(1, cores // workers)
+
+        version = datetime.now().strftime('%Y%m%d-%H%M%S')
+        staging = os.path.join(versions_dir, f'.{version}.tmp')
+        os.makedirs(staging)
+
+        print(f"Training {len(to_train)} of {len(jobs)} crops on {workers} processes x {n_jobs} threads...")
+        start = time.perf_counter()
+        results = {}
+        try:
+            for crop, (mode, prev) in plans.items():
+                if mode == 'reuse':
+                    for name in prev['files']:
+                        _link_or_copy(os.path.join(prev['dir'], name), os.path.join(staging, name))
+                    results[crop] = (0.0, 'reused', prev.get('n_estimators'))
+                    print(f"  {crop}: unchanged, reused from version {previous['version']}")
+            if to_train:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(_train_crop_job, crop, jobs[crop], staging, n_jobs, store_dir,
+                                           plans[crop][1] if plans[crop][0] == 'warm_start' else None): crop
+                               for crop in to_train}
+                    for future in as_completed(futures):
+                        crop = futures[future]
+                        results[crop] = future.result()
+                        print(f"  {crop}: {results[crop][1]} in {results[crop][0]:.1f}s")
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        files = sorted(os.listdir(staging))
+        manifest = {
+            'version': version,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'data_path': data_path,
+            'crops': {crop: {'files': [f for f in files if f.startswith(f'{crop}_')],
+                             'train_seconds': round(results[crop][0], 3),
+                             'mode': results[crop][1],
+                             'n_estimators': results[crop][2],
+                             'rows': int(rows[crop]),
+                             'data_fingerprint': fingerprints[crop],
+                             'config_fingerprint': config_fingerprint(crop)}
+                      for crop in sorted(jobs)},
+        }
+        failing = []
+        if max_mape is not None:
+            # imported here: backtest.py imports this module for MODEL_PARAMS
+            import backtest
+            scores = backtest.run_backtest(data_path)
+            write_manifest(os.path.join(staging, 'backtest.json'), scores)
+            for crop, info in manifest['crops'].items():
+                info['backtest_mape'] = scores['crops'].get(crop, {}).get('mape')
+            failing = backtest.failing_crops(scores, max_mape)
+        manifest['promoted'] = not failing
+        write_manifest(os.path.join(staging, 'manifest.json'), manifest)
+        version_dir = os.path.join(versions_dir, version)
+        os.rename(staging, version_dir)
+        if failing:
+            print(f"Version {version} not published: backtest MAPE above {max_mape:.2%} for {', '.join(failing)}")
+            return manifest
+        publish_version(version_dir, models_dir)
+
+        print(f"All models trained successfully! version {version} in {time.perf_counter() - start:.1f}s wall time")
+        return manifest
     except Exception as e:
         print(f"Error training models: {str(e)}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Train crop price models.")
+    parser.add_argument('--data', default=None,
+                        help=f"training CSV or data store directory (default: {data_store.STORE_DIR} "
+                             "if it has been built with `python data_store.py ingest`, else merged.csv)")
+    parser.add_argument('--workers', type=int, default=None, help="crop training processes (default: one per crop)")
+    parser.add_argument('--n-jobs', type=int, default=None, help="threads per forest fit (default: cores / workers)")
+    parser.add_argument('--max-mape', type=float, default=None,
+                        help="backtest the new version and publish it only if every crop's MAPE is within this (e.g. 0.15)")
+    parser.add_argument('--full', action='store_true',
+                        help="retrain every crop from scratch instead of reusing or warm-starting unchanged ones")
+    parser.add_argument('--export-only', action='store_true',
+                        help="only export compact forests and forecast cubes for the models already in models/")
+    args = parser.parse_args()
+    if args.export_only:
+        export_existing_models()
+    else:
+        data = args.data or (data_store.STORE_DIR if data_store.has_store() else 'merged.csv')
+        train_all_models(data, args.workers, args.n_jobs, max_mape=args.max_mape, full=args.full)
+
 if __name__ == "__main__":
-    train_all_models()
+    main()